@@ -0,0 +1,211 @@
+# NOTE: Map the basins of attraction of the replicator dynamic over the simplex of starting proportions.
+# Every starting point is evolved like ReplicatorDynamic.evolve, in batches spread over a pool of processes,
+# and counted at the stable rest point it ends up at. Only the counts are kept, so any number of points fits in memory.
+
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from GrandTable import GrandTable
+from ReplicatorDynamic import RestPoint, evolve_rows, replicator_step, rest_points, strategy_names
+
+
+class BasinMap:
+    """How many starting points of the simplex end up at every rest point of the replicator dynamic.
+    See *map_basins*.
+
+    Class attributes:
+        *names*: Names of the strategies of the grand table.
+
+        *rest_points*: The rest points of the dynamic, see ReplicatorDynamic.rest_points.
+
+        *counts*: counts[k] is the number of starting points that ended at rest_points[k],
+        which is 0 unless that rest point is stable.
+
+        *unconverged*: Number of starting points that hadn't reached a stable rest point after *max_steps* steps,
+        or that got stuck on another rest point because the strategies that would leave it underflowed to zero.
+
+        *nr_of_points*: Number of starting points.
+
+        *sampled*: True when the starting points were drawn uniformly at random from the simplex,
+        False when they were a grid. The confidence intervals only have their meaning for samples.
+    """
+    names: List[str]
+    rest_points: List[RestPoint]
+    counts: np.ndarray
+    unconverged: int
+    nr_of_points: int
+    sampled: bool
+
+    def __init__(self, names: List[str], rest_points: List[RestPoint], counts: np.ndarray, unconverged: int,
+                 sampled: bool) -> None:
+        self.names = names
+        self.rest_points = rest_points
+        self.counts = counts
+        self.unconverged = unconverged
+        self.nr_of_points = int(counts.sum()) + unconverged
+        self.sampled = sampled
+
+    def fractions(self) -> np.ndarray:
+        """Estimated size of the basin of every rest point, as a fraction of the simplex."""
+        return self.counts / self.nr_of_points
+
+    def confidence_intervals(self, z: float = 1.96) -> Tuple[np.ndarray, np.ndarray]:
+        """Wilson score interval of every fraction, 95% for the default *z*.
+        :return: The lower and the upper bounds."""
+        n = self.nr_of_points
+        fractions = self.fractions()
+        center = (fractions + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        half_width = z * np.sqrt(fractions * (1 - fractions) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+        return center - half_width, center + half_width
+
+    def __repr__(self) -> str:
+        lines = []
+        lower, upper = self.confidence_intervals()
+        for k in np.argsort(-self.counts, kind="stable"):
+            if self.counts[k] == 0:
+                continue
+            point = self.rest_points[k]
+            support = ", ".join(self.names[i] + " " + format(point.proportions[i], ".3f") for i in point.support)
+            line = "{:7.2%}".format(self.counts[k] / self.nr_of_points)
+            if self.sampled:
+                line += " ({:.2%} - {:.2%})".format(lower[k], upper[k])
+            lines.append(line + " " + point.stability + ": " + support)
+        if self.unconverged:
+            lines.append("{:7.2%}".format(self.unconverged / self.nr_of_points) + " didn't reach a stable rest point")
+        return "\n".join(lines)
+
+
+def map_basins(grand_table: GrandTable, nr_of_points: Optional[int] = None, resolution: Optional[int] = None,
+               seed: int = 0, chunk_size: int = 10000, workers: Optional[int] = None,
+               threshold: float = 1e-6, tolerance: float = 1e-3, max_steps: int = 10000) -> BasinMap:
+    """Evolve many starting proportions with the replicator dynamic and count where they end up.
+    Give either *nr_of_points* to sample the simplex uniformly, or *resolution* for the grid of all proportions
+    that are multiples of 1 / *resolution*. Every point is counted at the stable rest point it reaches.
+
+    The points are made and evolved in chunks by the workers, which only send back counts,
+    and only a few chunks are in flight at a time, so the memory use doesn't depend on the number of points.
+    Every chunk is seeded on its own, so the counts are the same for any number of workers.
+    :param seed: Seed of the samples.
+    :param chunk_size: Number of points evolved together in one batch.
+    :param workers: Number of worker processes, by default one per CPU. With 1 worker it runs in this process.
+    :param threshold: A point is first evolved until it moves less than this in a step, like *evolve*.
+    :param tolerance: A point that stopped is only counted once it is within this distance of a stable rest point.
+    The dynamic is also slow near saddles, so points that stopped elsewhere are stepped on until they get there.
+    :param max_steps: Points that didn't reach a stable rest point after this many steps are counted as unconverged.
+    """
+    if (nr_of_points is None) == (resolution is None):
+        raise Exception("Give either a number of points or a resolution.")
+    table = np.array(grand_table.grand_table, dtype=float)
+    points = rest_points(grand_table)
+    rest_proportions = np.array([point.proportions for point in points])
+    stable = np.array([point.stability == "stable" for point in points])
+
+    if nr_of_points is not None:
+        total = nr_of_points
+    else:
+        total = math.comb(resolution + len(table) - 1, len(table) - 1)
+    chunks = ((chunk, start, min(start + chunk_size, total))
+              for chunk, start in enumerate(range(0, total, chunk_size)))
+    args = (table, rest_proportions, stable, seed, resolution, threshold, tolerance, max_steps)
+
+    counts = np.zeros(len(points) + 1, dtype=np.int64)
+    for chunk_counts in map_chunks(chunks, args, workers):
+        counts += chunk_counts
+    return BasinMap(strategy_names(grand_table), points, counts[:-1], int(counts[-1]), nr_of_points is not None)
+
+
+def map_chunks(chunks: Iterator[Tuple[int, int, int]], args: tuple, workers: Optional[int]) -> Iterator[np.ndarray]:
+    """Run *basin_chunk* on every chunk and yield the counts as they come in,
+    with at most two chunks per worker in flight."""
+    if workers == 1:
+        for chunk in chunks:
+            yield basin_chunk(*chunk, *args)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(basin_chunk, *chunk, *args))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def basin_chunk(chunk: int, start: int, stop: int, table: np.ndarray, rest_proportions: np.ndarray,
+                stable: np.ndarray, seed: int, resolution: Optional[int], threshold: float, tolerance: float,
+                max_steps: int) -> np.ndarray:
+    """Evolve the starting points *start* up to *stop* and count them per rest point.
+    The last count is the number of points that didn't reach a stable rest point."""
+    if resolution is None:
+        rng = np.random.default_rng(np.random.SeedSequence([seed, chunk]))
+        proportions = rng.dirichlet(np.ones(len(table)), stop - start)
+    else:
+        proportions = grid_points(len(table), resolution, start, stop)
+    steps = np.zeros(len(proportions), dtype=int)
+    converged = np.zeros(len(proportions), dtype=bool)
+    evolve_rows(proportions, steps, converged, table, threshold, max_steps)
+
+    stable_indices = np.flatnonzero(stable)
+    nearest = np.full(len(proportions), len(rest_proportions))
+    active = np.arange(len(proportions))
+    while True:
+        closest, distance = closest_rest_points(proportions[active], rest_proportions[stable_indices])
+        settled = distance < tolerance
+        nearest[active[settled]] = stable_indices[closest[settled]]
+        active = active[~settled & (steps[active] < max_steps)]
+        if len(active) == 0:
+            break
+        # Step the others on in blocks, checking after every block whether they reached a stable rest point
+        block = int(min(100, np.min(max_steps - steps[active])))
+        before = proportions[active]
+        for _ in range(block):
+            proportions[active] = replicator_step(proportions[active], table)
+        steps[active] += block
+        # A point that didn't change at all is stuck for good: the strategies that would move it away
+        # from the rest point it is on have died out, as their proportions underflowed
+        active = active[np.any(proportions[active] != before, axis=1)]
+    return np.bincount(nearest, minlength=len(rest_proportions) + 1)
+
+
+def closest_rest_points(proportions: np.ndarray, rest_proportions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of the closest rest point of every row and the Euclidean distance to it (inf without rest points).
+    The distances are computed one rest point at a time to keep them small."""
+    closest = np.zeros(len(proportions), dtype=int)
+    best = np.full(len(proportions), np.inf)
+    for k, rest_point in enumerate(rest_proportions):
+        distance = np.sum((proportions - rest_point) ** 2, axis=1)
+        closer = distance < best
+        closest[closer] = k
+        best[closer] = distance[closer]
+    return closest, np.sqrt(best)
+
+
+def grid_points(nr_of_strategies: int, resolution: int, start: int, stop: int) -> np.ndarray:
+    """Points *start* up to *stop* of the grid of proportions that are multiples of 1 / *resolution*.
+    Every point is a way to place nr_of_strategies - 1 bars between *resolution* units,
+    the proportions are the numbers of units between the bars.
+    The points are in the lexicographic order of the bar positions, and point *r* is found from *r* directly
+    with the combinatorial number system, so every chunk costs the same wherever it starts."""
+    positions = resolution + nr_of_strategies - 1
+    nr_of_bars = nr_of_strategies - 1
+    ranks = np.arange(start, stop, dtype=np.int64)
+    bars = np.empty((len(ranks), nr_of_bars), dtype=np.int64)
+    candidates = np.zeros(len(ranks), dtype=np.int64)
+    for i in range(nr_of_bars):
+        # Move the bar past every position whose combinations with the bar there all come before the rank
+        for position in range(positions):
+            count = math.comb(positions - position - 1, nr_of_bars - i - 1)
+            skip = (candidates == position) & (ranks >= count)
+            ranks[skip] -= count
+            candidates[skip] += 1
+        bars[:, i] = candidates
+        candidates += 1
+    edges = np.hstack([np.full((len(bars), 1), -1), bars, np.full((len(bars), 1), positions)])
+    return (np.diff(edges, axis=1) - 1) / resolution
@@ -0,0 +1,495 @@
+# NOTE: Batched versions of the strategies in Strategies.py.
+# A batched strategy plays B independent copies of a strategy at once, each in its own game,
+# and keeps the state of all copies in NumPy arrays, so one call to *get_actions* or *update* handles every copy.
+#
+# Copy b makes exactly the same choices as the scalar strategy would with the b-th RandomStream
+# of its BatchedRandomStream: every copy draws the same number of uniforms, in the same order,
+# and the arithmetic is done in the same order, so even the floating point rounding is the same.
+# Games of different sizes are padded to the largest number of actions, padded actions are never picked.
+#
+# BatchedStrategyGame plays many games at once with batched strategies. The payoff matrices of all games are stacked
+# into one NumPy array, so looking up the payoffs and keeping the score of every game is one vectorized step per round.
+
+import abc
+import math
+import random
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+import Strategies
+from MatrixSuite import MatrixSuite, stack_payoff_matrices
+from Utils import BatchedRandomStream
+
+
+class BatchedStrategy(metaclass=abc.ABCMeta):
+    """Abstract representation of B copies of a strategy, each playing its own game.
+
+    Class attributes:
+        *name*: A string representing the name of the strategy.
+
+        *random_streams*: The BatchedRandomStream with one stream per copy.
+        When it is None (or has the wrong number of copies) at *initialize*,
+        new streams are seeded from the global random module.
+
+        *nr_of_copies*: Number of copies B.
+
+        *nr_of_actions*: Array of shape (B,) with the number of actions of every copy.
+
+        *valid*: Boolean array of shape (B, A), True for the actions a copy has.
+
+        *payoffs*: Array of shape (B, A, O) with the payoff of every copy for its own action and the opponent action.
+
+        *opp_payoffs*: Array of shape (B, A, O) with the payoff of the opponent, indexed the same way.
+    """
+    name: str
+    random_streams: Optional[BatchedRandomStream] = None
+    nr_of_copies: int
+    nr_of_actions: np.ndarray
+    valid: np.ndarray
+    payoffs: np.ndarray
+    opp_payoffs: np.ndarray
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        """Initialize/reset all copies with a new game, copy b plays the current matrix of *matrix_suites[b]*.
+        Subclasses should call this before setting up their own state.
+        :param player: Either 'row' or 'col', the same for all copies.
+        """
+        stacked = stack_payoff_matrices(matrix_suites)
+        nr_of_rows = np.array([len(matrix_suite.row_actions) for matrix_suite in matrix_suites])
+        nr_of_cols = np.array([len(matrix_suite.col_actions) for matrix_suite in matrix_suites])
+        if player == "row":
+            self.payoffs = stacked[..., 0]
+            self.opp_payoffs = stacked[..., 1]
+            self.nr_of_actions, nr_of_opp_actions = nr_of_rows, nr_of_cols
+        else:
+            self.payoffs = stacked[..., 1].transpose(0, 2, 1)
+            self.opp_payoffs = stacked[..., 0].transpose(0, 2, 1)
+            self.nr_of_actions, nr_of_opp_actions = nr_of_cols, nr_of_rows
+
+        self.nr_of_copies = len(matrix_suites)
+        self._copies = np.arange(self.nr_of_copies)
+        self.valid = np.arange(self.payoffs.shape[1]) < self.nr_of_actions[:, None]
+        self._valid_cells = self.valid[:, :, None] & (np.arange(self.payoffs.shape[2]) < nr_of_opp_actions[:, None])[:, None, :]
+        self.round_ = 0
+
+        if self.random_streams is None or len(self.random_streams) != self.nr_of_copies:
+            self.random_streams = BatchedRandomStream([random.getrandbits(64) for _ in range(self.nr_of_copies)])
+
+    @abc.abstractmethod
+    def get_actions(self, round_: int) -> np.ndarray:
+        """Calculate the action of every copy for this round, as an integer array of shape (B,).
+        :param round_: The current round number.
+        """
+        pass
+
+    @abc.abstractmethod
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        """Update every copy with the result of this round, all arrays have shape (B,).
+        :param round_: The current round number.
+        :param actions: The actions the copies played this round.
+        :param payoffs: The payoffs the copies received this round.
+        :param opp_actions: The actions the opposing strategies played this round.
+        :param opp_payoffs: The payoffs the opposing strategies received this round.
+        """
+        pass
+
+    def set_random_streams(self, random_streams: Optional[BatchedRandomStream]) -> None:
+        """Give the copies their own streams of random numbers, copy b uses stream b."""
+        self.random_streams = random_streams
+
+    def random_choices(self, counts: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pick a random index below *counts[b]* for every copy where *mask* is True (all by default),
+        drawing one uniform for each of those copies, like Strategy.random_choice on a sequence of that length."""
+        return self.random_streams.choices(counts, mask)
+
+    def optimal_actions(self, values: np.ndarray) -> np.ndarray:
+        """Boolean array of shape (B, A), True for the actions of every copy with the maximum value."""
+        values = np.where(self.valid, values, -np.inf)
+        return self.valid & (values == values.max(axis=1, keepdims=True))
+
+    def random_optimal_actions(self, values: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pick one of the actions with the maximum value at random, for every copy where *mask* is True."""
+        optimal = self.optimal_actions(values)
+        return nth_true(optimal, self.random_choices(optimal.sum(axis=1), mask))
+
+    def row_sums(self, values: np.ndarray) -> np.ndarray:
+        """Sum the values of the valid actions of every copy from left to right, like Python's sum of a list,
+        so the rounding is the same as that of the scalar strategies."""
+        total = np.zeros(self.nr_of_copies)
+        for a in range(values.shape[1]):
+            total = total + np.where(self.valid[:, a], values[:, a], 0.0)
+        return total
+
+    def potential_payoffs(self, opp_actions: np.ndarray) -> np.ndarray:
+        """Payoff of every action of every copy against the given opponent actions, shape (B, A)."""
+        return self.payoffs[self._copies, :, opp_actions]
+
+    def payoff_midpoints(self) -> np.ndarray:
+        """(min + max) / 2 of all the payoffs every copy can get, shape (B,)."""
+        min_payoffs = np.where(self._valid_cells, self.payoffs, np.inf).min(axis=(1, 2))
+        max_payoffs = np.where(self._valid_cells, self.payoffs, -np.inf).max(axis=(1, 2))
+        return (min_payoffs + max_payoffs) / 2
+
+
+class BatchedAselect(BatchedStrategy):
+    """Batched version of Aselect."""
+
+    def __init__(self):
+        self.name = "Aselect"
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        return self.random_choices(self.nr_of_actions)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        pass
+
+
+class BatchedEpsilonGreedy(BatchedStrategy):
+    """Batched version of EpsilonGreedy."""
+
+    def __init__(self, epsilon: float):
+        self.name = "EGreedy"
+        self.epsilon = epsilon
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.action_payoffs = np.zeros(self.valid.shape)
+        self.action_nums = np.ones(self.valid.shape, dtype=int)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        if self.round_ == 0:
+            return self.random_choices(self.nr_of_actions)
+
+        optimal = self.optimal_actions(self.action_payoffs / self.action_nums)
+        nr_of_optimal = optimal.sum(axis=1)
+        random_actions = self.random_choices(self.nr_of_actions)
+
+        # The scalar strategy picks from a list with every optimal action repeated and the random action repeated
+        repeats = ((1 - self.epsilon) * 100 / nr_of_optimal).astype(int)
+        indices = self.random_choices(nr_of_optimal * repeats + int(self.epsilon * 100))
+        return np.where(indices < nr_of_optimal * repeats, nth_true(optimal, indices % nr_of_optimal), random_actions)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.action_payoffs[self._copies, actions] += payoffs
+        self.action_nums[self._copies, actions] += 1
+
+
+class BatchedUCB(BatchedStrategy):
+    """Batched version of UCB."""
+
+    def __init__(self, confidence_level: float):
+        self.name = "UCB"
+        self.confidence_level = confidence_level
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.action_payoffs = np.zeros(self.valid.shape)
+        self.action_nums = np.ones(self.valid.shape, dtype=int)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        if self.round_ == 0:
+            return self.random_choices(self.nr_of_actions)
+
+        action_values = self.action_payoffs / self.action_nums
+        adjusted_action_values = action_values + self.confidence_level * np.sqrt(np.log(self.round_) / self.action_nums)
+        return self.random_optimal_actions(adjusted_action_values)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.action_payoffs[self._copies, actions] += payoffs
+        self.action_nums[self._copies, actions] += 1
+
+
+class BatchedSatisficingPlay(BatchedStrategy):
+    """Batched version of SatisficingPlay."""
+
+    def __init__(self, persistence_rate: float, initial_aspiration_level: float):
+        self.name = "SatisficingPlay"
+        self.persistence_rate = persistence_rate
+        self.initial_aspiration_level = initial_aspiration_level
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.previous_aspiration_levels = np.full(self.nr_of_copies, float(self.initial_aspiration_level))
+        self.previous_actions = np.zeros(self.nr_of_copies, dtype=int)
+        self.previous_payoffs = np.zeros(self.nr_of_copies)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        if self.round_ == 0:
+            return self.random_choices(self.nr_of_actions)
+
+        # Only the copies that aren't satisfied draw a new action
+        unsatisfied = ~(self.previous_payoffs >= self.previous_aspiration_levels)
+        return np.where(unsatisfied, self.random_choices(self.nr_of_actions, unsatisfied), self.previous_actions)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.previous_actions = np.array(actions, dtype=int)
+        self.previous_payoffs = np.array(payoffs, dtype=float)
+        self.previous_aspiration_levels = (self.persistence_rate * self.previous_aspiration_levels
+                                           + (1 - self.persistence_rate) * self.previous_payoffs)
+
+
+class BatchedBully(BatchedStrategy):
+    """Batched version of Bully."""
+
+    def __init__(self):
+        self.name = "Bully"
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        # The security value of an action is its lowest own payoff among the best responses of the opponent
+        opp_payoffs = np.where(self._valid_cells, self.opp_payoffs, -np.inf)
+        best_responses = self._valid_cells & (opp_payoffs == opp_payoffs.max(axis=2, keepdims=True))
+        security_values = np.where(best_responses, self.payoffs, np.inf).min(axis=2)
+        self.actions = np.argmax(np.where(self.valid, security_values, -np.inf), axis=1)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        return self.actions.copy()
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+
+
+class BatchedFictitiousPlay(BatchedStrategy):
+    """Batched version of FictitiousPlay."""
+
+    def __init__(self):
+        self.name = "FictitiousPlay"
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.beliefs = np.zeros(self.valid.shape, dtype=int)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        return self.random_optimal_actions(self.beliefs)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.beliefs += self.optimal_actions(self.potential_payoffs(opp_actions))
+
+
+class BatchedRegretMatching(BatchedStrategy):
+    """Batched version of RegretMatching."""
+
+    def __init__(self):
+        self.name = "RegretMatching"
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.cumulative_actual_payoffs = np.zeros(self.nr_of_copies)
+        self.cumulative_expected_payoffs = np.zeros(self.valid.shape)
+        self.regret_matching = np.zeros(self.valid.shape)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        # The sum of the non-negative regrets is positive exactly when one of them is
+        positive = (self.regret_matching > 0).any(axis=1)
+        return np.where(positive, self.random_optimal_actions(self.regret_matching, positive),
+                        self.random_choices(self.nr_of_actions, ~positive))
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.cumulative_actual_payoffs = self.cumulative_actual_payoffs + payoffs
+        self.cumulative_expected_payoffs = self.cumulative_expected_payoffs + self.potential_payoffs(opp_actions)
+
+        average_regrets = (self.cumulative_expected_payoffs - self.cumulative_actual_payoffs[:, None]) / round_
+        average_regrets = np.where(self.valid & (average_regrets > 0.0), average_regrets, 0.0)
+
+        sum_of_average_regrets = self.row_sums(average_regrets)
+        positive = sum_of_average_regrets > 0
+        self.regret_matching = np.where(positive[:, None],
+                                        average_regrets / np.where(positive, sum_of_average_regrets, 1.0)[:, None], 0.0)
+
+
+class BatchedSoftmax(BatchedStrategy):
+    """Batched version of Softmax.
+    Only the Q-value of the played action changes, so only its exponential is recomputed every round."""
+
+    def __init__(self, initial_q_value: float, learning_rate: float, temperature: float):
+        self.name = "Softmax"
+        self.initial_q_value = initial_q_value
+        self.learning_rate = learning_rate
+        self.temperature = temperature
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.geometric_averages = np.repeat(self.payoff_midpoints()[:, None], self.valid.shape[1], axis=1)
+        self.q_values = np.full(self.valid.shape, float(self.initial_q_value))
+        self._exponentials = np.full(self.valid.shape, math.e ** (self.initial_q_value / self.temperature))
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        return self.random_optimal_actions(self.geometric_averages)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        q_values = (1 - self.learning_rate) * self.q_values[self._copies, actions] + self.learning_rate * payoffs
+        self.q_values[self._copies, actions] = q_values
+        # Python's float power, as NumPy's vectorized power may round differently
+        self._exponentials[self._copies, actions] = [math.e ** (x / self.temperature) for x in q_values.tolist()]
+
+        self.geometric_averages = self._exponentials / self.row_sums(self._exponentials)[:, None]
+
+
+class BatchedMutualBenefit(BatchedStrategy):
+    """Batched version of MutualBenefit."""
+
+    def __init__(self):
+        self.name = "MutualBenefit"
+
+    def initialize(self, matrix_suites: List[MatrixSuite], player: str) -> None:
+        super().initialize(matrix_suites, player)
+        self.action_payoffs = np.repeat(self.payoff_midpoints()[:, None], self.valid.shape[1], axis=1)
+        self.action_nums = np.ones(self.valid.shape, dtype=int)
+
+    def get_actions(self, round_: int) -> np.ndarray:
+        return self.random_optimal_actions(self.action_payoffs / self.action_nums)
+
+    def update(self, round_: int, actions: np.ndarray, payoffs: np.ndarray,
+               opp_actions: np.ndarray, opp_payoffs: np.ndarray) -> None:
+        self.round_ = round_
+        self.action_payoffs[self._copies, actions] += payoffs + opp_payoffs
+        self.action_nums[self._copies, actions] += 1
+
+
+# How to make the batched version of every scalar strategy, from its parameters
+batched_versions: Dict[Type[Strategies.Strategy], Callable[[Strategies.Strategy], BatchedStrategy]] = {
+    Strategies.Aselect: lambda s: BatchedAselect(),
+    Strategies.EpsilonGreedy: lambda s: BatchedEpsilonGreedy(s.epsilon),
+    Strategies.UCB: lambda s: BatchedUCB(s.confidence_level),
+    Strategies.SatisficingPlay: lambda s: BatchedSatisficingPlay(s.persistence_rate, s.initial_aspiration_level),
+    Strategies.Bully: lambda s: BatchedBully(),
+    Strategies.FictitiousPlay: lambda s: BatchedFictitiousPlay(),
+    Strategies.RegretMatching: lambda s: BatchedRegretMatching(),
+    Strategies.Softmax: lambda s: BatchedSoftmax(s.initial_q_value, s.learning_rate, s.temperature),
+    Strategies.MutualBenefit: lambda s: BatchedMutualBenefit(),
+}
+
+
+def batched_strategy(strategy: Strategies.Strategy) -> BatchedStrategy:
+    """Return the batched version of a scalar strategy, with the same parameters."""
+    if type(strategy) not in batched_versions:
+        raise Exception("There is no batched version of " + type(strategy).__name__ + ".")
+    return batched_versions[type(strategy)](strategy)
+
+
+def nth_true(mask: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Index of the *n[b]*-th (from 0) True value in every row *b* of a boolean array."""
+    return np.argmax(np.cumsum(mask, axis=1) > n[:, None], axis=1)
+
+
+class BatchedStrategyGame:
+    """Play a batch of 2 player games with batched strategies, one round of every game per call to *play*.
+
+    The games are split into groups that are played by the copies of one BatchedStrategy:
+    *row_groups* is a list of (batched strategy, game indices), copy b of the strategy is the row player
+    of game *games[b]*, and every game is in exactly one row group and one col group.
+
+    Class attributes:
+        *matrix_suites*: One MatrixSuite per game, they should NOT be updated during the game.
+
+        *payoffs*: Array of shape (games, R, C, 2) with the stacked payoff matrices,
+        where R and C are the largest number of row and column actions of all games.
+        Smaller matrices are padded with zeros, those entries are never played.
+
+        *round_*: Keeps track of the current round number.
+
+        *row_groups*: The (batched strategy, game indices) of the row players.
+
+        *col_groups*: The (batched strategy, game indices) of the column players.
+
+        *row_player_actions*: Actions played by the row players in the last round.
+
+        *col_player_actions*: Actions played by the column players in the last round.
+
+        *row_player_payoff_sums*: Sum of the payoffs received by the row players.
+
+        *col_player_payoff_sums*: Sum of the payoffs received by the column players.
+    """
+    matrix_suites: List[MatrixSuite]
+    payoffs: np.ndarray
+    round_: int
+    row_groups: List[Tuple[BatchedStrategy, np.ndarray]]
+    col_groups: List[Tuple[BatchedStrategy, np.ndarray]]
+    row_player_actions: np.ndarray
+    col_player_actions: np.ndarray
+    row_player_payoff_sums: np.ndarray
+    col_player_payoff_sums: np.ndarray
+
+    def __init__(self, matrix_suites: List[MatrixSuite],
+                 row_groups: List[Tuple[BatchedStrategy, Sequence[int]]],
+                 col_groups: List[Tuple[BatchedStrategy, Sequence[int]]]) -> None:
+        """Set all the variables and call the initialize method."""
+        self.row_groups = [(strategy, np.asarray(games, dtype=int)) for strategy, games in row_groups]
+        self.col_groups = [(strategy, np.asarray(games, dtype=int)) for strategy, games in col_groups]
+        for groups in (self.row_groups, self.col_groups):
+            games = np.sort(np.concatenate([games for _, games in groups]))
+            if not np.array_equal(games, np.arange(len(matrix_suites))):
+                raise Exception("Every game needs to be in exactly one row group and one col group.")
+        self.initialize(matrix_suites)
+
+    def initialize(self, matrix_suites: List[MatrixSuite]) -> None:
+        """(Re-) initialize all games with updated matrix suites."""
+        self.matrix_suites = matrix_suites
+        self.payoffs = stack_payoff_matrices(matrix_suites)
+        self.round_ = 0
+
+        nr_of_games = len(matrix_suites)
+        self._games = np.arange(nr_of_games)
+        self.row_player_actions = np.zeros(nr_of_games, dtype=int)
+        self.col_player_actions = np.zeros(nr_of_games, dtype=int)
+        self.row_player_payoff_sums = np.zeros(nr_of_games)
+        self.col_player_payoff_sums = np.zeros(nr_of_games)
+
+        for strategy, games in self.row_groups:
+            strategy.initialize([matrix_suites[g] for g in games], "row")
+        for strategy, games in self.col_groups:
+            strategy.initialize([matrix_suites[g] for g in games], "col")
+
+    def play(self) -> None:
+        """Play one round of every game."""
+        self.round_ += 1
+
+        for strategy, games in self.row_groups:
+            self.row_player_actions[games] = strategy.get_actions(self.round_)
+        for strategy, games in self.col_groups:
+            self.col_player_actions[games] = strategy.get_actions(self.round_)
+
+        payoffs = self.payoffs[self._games, self.row_player_actions, self.col_player_actions]
+        row_payoffs = payoffs[:, 0]
+        col_payoffs = payoffs[:, 1]
+        self.row_player_payoff_sums += row_payoffs
+        self.col_player_payoff_sums += col_payoffs
+
+        for strategy, games in self.row_groups:
+            strategy.update(self.round_, self.row_player_actions[games], row_payoffs[games],
+                            self.col_player_actions[games], col_payoffs[games])
+        for strategy, games in self.col_groups:
+            strategy.update(self.round_, self.col_player_actions[games], col_payoffs[games],
+                            self.row_player_actions[games], row_payoffs[games])
+
+    def play_rounds(self, rounds: int) -> None:
+        """Play the given number of rounds of every game."""
+        for _ in range(rounds):
+            self.play()
+
+    def row_player_mean_payoffs(self) -> np.ndarray:
+        """Average payoff per round of the row player of every game."""
+        return self.row_player_payoff_sums / self.round_
+
+    def col_player_mean_payoffs(self) -> np.ndarray:
+        """Average payoff per round of the column player of every game."""
+        return self.col_player_payoff_sums / self.round_
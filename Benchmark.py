@@ -0,0 +1,207 @@
+# Note: Benchmarks of the strategies, Game, GrandTable and ReplicatorDynamic.
+# Run it from the command line, i.e. "python Benchmark.py --output bench.json",
+# and compare a later run against it with "python Benchmark.py --baseline bench.json".
+#
+# All results are rates (calls or rounds per second) or wall times in seconds,
+# the name of every result says which one it is.
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import MatrixSuite
+import Strategies
+from Game import Game
+from GrandTable import GrandTable
+from ReplicatorDynamic import ReplicatorDynamic
+
+# The same parameters as used in Main.py
+benchmark_strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0),
+                        Strategies.SatisficingPlay(0.1, 2.0), Strategies.Bully(), Strategies.FictitiousPlay(),
+                        Strategies.RegretMatching(), Strategies.Softmax(5.0, 0.1, 1.0), Strategies.MutualBenefit()]
+
+
+class SquareMatrixSuite(MatrixSuite.MatrixSuite):
+    """Random matrix suite with a fixed number of actions for both players, to benchmark large games."""
+
+    def __init__(self, nr_of_actions: int) -> None:
+        self.name = "Square Matrix Suite"
+        self.nr_of_actions = nr_of_actions
+        self.generate_new_payoff_matrix()
+
+    def generate_new_payoff_matrix(self) -> None:
+        self.row_actions = list(range(self.nr_of_actions))
+        self.col_actions = list(range(self.nr_of_actions))
+        self.payoff_matrix = [[(random.uniform(0.0, 3.0), random.uniform(0.0, 3.0))
+                               for _ in self.col_actions]
+                              for _ in self.row_actions]
+
+
+def rate(function: Callable[[], None], min_time: float) -> float:
+    """Call *function* until at least *min_time* seconds have passed and return the calls per second."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def wall_time(function: Callable[[], None], repeats: int) -> float:
+    """Best wall time of *repeats* calls of *function*, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_strategies(action_counts: List[int], min_time: float) -> Dict[str, float]:
+    """Calls per second of *get_action* and *update* of every strategy, for games of different sizes."""
+    results = {}
+    for nr_of_actions in action_counts:
+        matrix_suite = SquareMatrixSuite(nr_of_actions)
+        for prototype in benchmark_strategies:
+            strategy = copy.deepcopy(prototype)
+            strategy.initialize(matrix_suite, "row")
+            round_ = [0]
+            # Random joint actions for the updates, so the update timing doesn't include get_action
+            joint_actions = [(random.choice(matrix_suite.row_actions), random.choice(matrix_suite.col_actions))
+                             for _ in range(1024)]
+
+            def get_action():
+                round_[0] += 1
+                strategy.get_action(round_[0])
+
+            def update():
+                round_[0] += 1
+                action, opp_action = joint_actions[round_[0] % 1024]
+                payoffs = matrix_suite.payoff_matrix[action][opp_action]
+                strategy.update(round_[0], action, payoffs[0], opp_action, payoffs[1])
+
+            # Update some rounds first, most strategies do something else in the first round
+            for _ in range(10):
+                update()
+
+            key = "strategy/" + prototype.name + "/actions=" + str(nr_of_actions)
+            results[key + "/get_action_per_s"] = rate(get_action, min_time)
+            results[key + "/update_per_s"] = rate(update, min_time)
+    return results
+
+
+def bench_game(min_time: float) -> Dict[str, float]:
+    """Rounds per second of Game.play for every strategy against itself, on the fixed matrix suite."""
+    results = {}
+    for prototype in benchmark_strategies:
+        game = Game(MatrixSuite.FixedMatrixSuite(), copy.deepcopy(prototype), copy.deepcopy(prototype),
+                    streaming=True)
+        results["game/" + prototype.name + "/rounds_per_s"] = rate(game.play, min_time)
+    return results
+
+
+def bench_end_to_end(strategy_counts: List[int], round_counts: List[int], repeats: int) -> Dict[str, float]:
+    """Wall time of GrandTable.play and ReplicatorDynamic.evolve for several numbers of strategies and rounds."""
+    results = {}
+    for nr_of_strategies in strategy_counts:
+        strategies = benchmark_strategies[:nr_of_strategies]
+        for rounds in round_counts:
+            grand_tables = []
+
+            def play():
+                random.seed(0)
+                grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(), strategies, 2, rounds)
+                # GrandTable prints every matrix, which would only measure the terminal
+                with contextlib.redirect_stdout(io.StringIO()):
+                    grand_table.play()
+                grand_tables.append(grand_table)
+
+            key = "grand_table/strategies=" + str(nr_of_strategies) + "/rounds=" + str(rounds)
+            results[key + "/wall_s"] = wall_time(play, repeats)
+
+        def evolve():
+            replicator_dynamic = ReplicatorDynamic([1 / nr_of_strategies] * nr_of_strategies, grand_tables[-1])
+            replicator_dynamic.evolve()
+
+        key = "replicator_dynamic/strategies=" + str(nr_of_strategies)
+        results[key + "/wall_s"] = wall_time(evolve, repeats)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Return a message for every result that is more than *tolerance* (a fraction) worse than the baseline.
+    Rates should not go down, wall times should not go up."""
+    regressions = []
+    for key, value in sorted(results.items()):
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        if key.endswith("_per_s"):
+            change = (old - value) / old
+        else:
+            change = (value - old) / old
+        if change > tolerance:
+            regressions.append("{}: {:.4g} -> {:.4g} ({:+.0%})".format(key, old, value, change))
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the strategies, Game, GrandTable and ReplicatorDynamic.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare the results against this earlier JSON output.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed fraction a result can be worse than the baseline (default 0.2).")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and shorter timings, for a smoke test.")
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    if args.quick:
+        action_counts, strategy_counts, round_counts, min_time, repeats = [2, 10], [2, 9], [10], 0.02, 1
+    else:
+        action_counts, strategy_counts, round_counts, min_time, repeats = [2, 5, 10, 100, 1000], [2, 5, 9], \
+                                                                          [100, 1000], 0.5, 3
+
+    results = {}
+    results.update(bench_strategies(action_counts, min_time))
+    results.update(bench_game(min_time))
+    results.update(bench_end_to_end(strategy_counts, round_counts, repeats))
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(output, indent=2, sort_keys=True))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,235 @@
+# NOTE: Run work units on worker processes on any host, through a simple TCP work queue.
+# The coordinator hands out one unit at a time to every connected worker and collects the results.
+# A unit whose worker disconnects (or takes longer than the timeout) is handed out again to another worker.
+#
+# Start a worker on another machine with:
+#   MAL_AUTHKEY=<key> python Distributed.py <coordinator host> <coordinator port>
+#
+# The messages are pickled, so anyone who knows the key can run code on the coordinator and the workers.
+# Connections are authenticated with a shared key using the HMAC handshake of multiprocessing.connection.
+# The key is taken from the MAL_AUTHKEY environment variable, which the workers need.
+# Without it the coordinator makes a random key and prints it, there is no default key.
+
+import ipaddress
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+Address = Tuple[str, int]
+
+
+def default_authkey() -> Optional[bytes]:
+    """The key of the MAL_AUTHKEY environment variable, None when it isn't set."""
+    key = os.environ.get("MAL_AUTHKEY")
+    return key.encode() if key else None
+
+
+def is_loopback(host: str) -> bool:
+    """Whether the host name or address can only be reached from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Coordinator:
+    """Hand out work units over TCP to any number of workers (see *run_worker*) and collect their results.
+
+    Class attributes:
+        *address*: The (host, port) the coordinator listens on, workers should connect to it.
+
+        *unit_timeout*: Seconds a worker gets for one unit before it is considered lost, None to wait forever.
+
+        *authkey*: The key workers need to connect.
+
+        *max_attempts*: Number of times a unit is handed out before the run fails,
+        counted over all workers, whether the worker was lost or the unit raised an exception.
+
+        *attempts*: Number of times every unit has been handed out so far.
+    """
+    address: Address
+    authkey: bytes
+    unit_timeout: Optional[float]
+    max_attempts: int
+    attempts: Dict[int, int]
+
+    def __init__(self, address: Address = ("localhost", 0), authkey: Optional[bytes] = None,
+                 unit_timeout: Optional[float] = None, max_attempts: int = 5) -> None:
+        """Start listening on the given address, port 0 picks a free port.
+        :param authkey: The key workers need, by default MAL_AUTHKEY. Without either a random key is made,
+        which is printed when the address can be reached from other machines, to start the workers with.
+        """
+        if authkey is None:
+            authkey = default_authkey()
+        generated = authkey is None
+        if generated:
+            authkey = secrets.token_hex(16).encode()
+        self.authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        if generated and not is_loopback(self.address[0]):
+            print("Start the workers with MAL_AUTHKEY=" + authkey.decode())
+        self.unit_timeout = unit_timeout
+        self.max_attempts = max_attempts
+        self.attempts = {}
+
+        self._condition = threading.Condition()
+        self._pending: Deque[int] = deque()
+        self._results: Dict[int, Any] = {}
+        self._units: List[Tuple[Callable, Sequence[Any]]] = []
+        self._finished = False
+        self._error: Optional[str] = None
+
+    def run(self, function: Callable, args_list: List[Sequence[Any]]) -> List[Any]:
+        """Call *function* on the workers once for every tuple of arguments and return the results in order.
+        The function has to be defined at module level, so the workers can import it.
+        Blocks until every unit has a result, this also closes the coordinator.
+        """
+        with self._condition:
+            self._units = [(function, args) for args in args_list]
+            self._pending.extend(range(len(args_list)))
+
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        accept_thread.start()
+
+        with self._condition:
+            while len(self._results) < len(self._units) and self._error is None:
+                self._condition.wait()
+            self._finished = True
+            self._condition.notify_all()
+        self._listener.close()
+
+        if self._error is not None:
+            raise Exception(self._error)
+        return [self._results[unit_id] for unit_id in range(len(self._units))]
+
+    def _accept_loop(self) -> None:
+        """Accept workers until the coordinator is closed, and serve each one in its own thread."""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError):
+                # Closed, or a client that failed the authentication
+                if self._finished:
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        """Hand out units to one worker until everything is done or the worker is lost."""
+        unit_id = None
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "result":
+                    self._add_result(message[1], message[2])
+                    unit_id = None
+                elif message[0] == "error":
+                    self._add_error(message[1], message[2])
+                    unit_id = None
+
+                unit_id = self._next_unit()
+                if unit_id is None:
+                    conn.send(("done",))
+                    return
+                function, args = self._units[unit_id]
+                conn.send(("work", unit_id, function, args))
+                if self.unit_timeout is not None and not conn.poll(self.unit_timeout):
+                    raise TimeoutError("worker took longer than " + str(self.unit_timeout) + " seconds")
+        except (EOFError, OSError, TimeoutError):
+            # The worker is lost, hand its unit to another worker
+            if unit_id is not None:
+                self._requeue(unit_id)
+        finally:
+            conn.close()
+
+    def _next_unit(self) -> Optional[int]:
+        """Take the next pending unit, waiting while other workers may still give one back. None when done."""
+        with self._condition:
+            while not self._pending and not self._finished and self._error is None:
+                self._condition.wait()
+            if self._finished or self._error is not None:
+                return None
+            unit_id = self._pending.popleft()
+            self.attempts[unit_id] = self.attempts.get(unit_id, 0) + 1
+            if self.attempts[unit_id] > self.max_attempts:
+                self._error = "Work unit " + str(unit_id) + " failed " + str(self.max_attempts) + " times."
+                self._condition.notify_all()
+                return None
+            return unit_id
+
+    def _add_result(self, unit_id: int, result: Any) -> None:
+        with self._condition:
+            # A unit that was handed out again can come back twice, the results are the same so keep the first
+            self._results.setdefault(unit_id, result)
+            self._condition.notify_all()
+
+    def _add_error(self, unit_id: int, error: str) -> None:
+        """A unit raised an exception on a worker: try it again, unless it was handed out too often already."""
+        with self._condition:
+            if self.attempts[unit_id] >= self.max_attempts:
+                self._error = "Work unit " + str(unit_id) + " failed " + str(self.max_attempts) + " times:\n" + error
+                self._condition.notify_all()
+            elif unit_id not in self._results:
+                self._pending.appendleft(unit_id)
+                self._condition.notify_all()
+
+    def _requeue(self, unit_id: int) -> None:
+        with self._condition:
+            if unit_id not in self._results:
+                self._pending.appendleft(unit_id)
+                self._condition.notify_all()
+
+
+def run_worker(address: Address, authkey: Optional[bytes] = None, connect_timeout: float = 30.0) -> int:
+    """Connect to a coordinator, run the units it hands out until it is done, and return the number of units run.
+    A unit that raises an exception is reported to the coordinator, which decides whether to try it again.
+    :param authkey: The key of the coordinator, by default MAL_AUTHKEY.
+    :param connect_timeout: Seconds to keep retrying when the coordinator isn't listening yet.
+    """
+    if authkey is None:
+        authkey = default_authkey()
+    if authkey is None:
+        raise Exception("Set MAL_AUTHKEY to the key of the coordinator.")
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+    units = 0
+    with conn:
+        conn.send(("ready",))
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                # The coordinator already has all results
+                return units
+            if message[0] == "done":
+                return units
+            _, unit_id, function, args = message
+            try:
+                conn.send(("result", unit_id, function(*args)))
+            except Exception:
+                conn.send(("error", unit_id, traceback.format_exc()))
+            units += 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: MAL_AUTHKEY=<key> python Distributed.py <coordinator host> <coordinator port>")
+        sys.exit(1)
+    print("Units run:", run_worker((sys.argv[1], int(sys.argv[2]))))
@@ -2,11 +2,15 @@
 # feel free to come up with your own way. You may change almost everything of this class,
 # it just has to play 2 strategies against each other on a matrix game.
 
-from typing import List
+from statistics import mean
+from time import perf_counter
+from typing import List, Optional
 
 import MatrixSuite
 from Strategies import Strategy
 from MatrixSuite import Payoff, Action
+from Profiler import Profiler
+from Utils import RunningStatistics
 
 
 class Game:
@@ -30,6 +34,24 @@ class Game:
         *row_player_payoffs*: History of the payoffs received by the row player.
 
         *col_player_payoffs*: History of the payoffs received by the column player.
+
+        *streaming*: If True the histories above stay empty,
+        instead only the statistics below are kept, so the memory use doesn't grow with the number of rounds.
+
+        *row_player_payoff_stats*: Running count, sum, mean and variance of the payoffs of the row player.
+
+        *col_player_payoff_stats*: Running count, sum, mean and variance of the payoffs of the column player.
+
+        *row_player_action_counts*: Number of times the row player played each of its actions.
+
+        *col_player_action_counts*: Number of times the column player played each of its actions.
+
+        *last_round*: Tuple of the row action, col action, row payoff and col payoff of the last round played.
+
+        *fast_forwarded_rounds*: Number of rounds that were filled in by *play_rounds* instead of played.
+
+        *profiler*: Optional Profiler that adds up the time of every strategy method, the payoff lookup
+        and the bookkeeping. Without one *play* only checks that it is None.
     """
     matrix_suite: MatrixSuite
     round_: int
@@ -39,53 +61,176 @@ class Game:
     col_player_actions: List[Action]
     row_player_payoffs: List[Payoff]
     col_player_payoffs: List[Payoff]
-
-    def __init__(self, game_suite: MatrixSuite, row_player: Strategy, col_player: Strategy) -> None:
+    streaming: bool
+    row_player_payoff_stats: RunningStatistics
+    col_player_payoff_stats: RunningStatistics
+    row_player_action_counts: List[int]
+    col_player_action_counts: List[int]
+    fast_forwarded_rounds: int
+    profiler: Optional[Profiler]
+
+    def __init__(self, game_suite: MatrixSuite, row_player: Strategy, col_player: Strategy,
+                 streaming: bool = False, profiler: Optional[Profiler] = None) -> None:
         """Set all the variables and call the initialize method."""
         self.row_player = row_player
         self.col_player = col_player
+        self.streaming = streaming
+        self.profiler = profiler
         self.initialize(game_suite)
 
     def initialize(self, game_suite: MatrixSuite) -> None:
         """(Re-) initialize the game with an updated matrix suite."""
         self.matrix_suite = game_suite
+        # The payoff matrix doesn't change during the game, so look it up once instead of every round
+        self._payoff_matrix = game_suite.payoff_matrix
         self.round_ = 0
         self.row_player_actions = []
         self.col_player_actions = []
         self.row_player_payoffs = []
         self.col_player_payoffs = []
+        self.row_player_payoff_stats = RunningStatistics()
+        self.col_player_payoff_stats = RunningStatistics()
+        self.row_player_action_counts = [0 for _ in self.matrix_suite.row_actions]
+        self.col_player_action_counts = [0 for _ in self.matrix_suite.col_actions]
+        self.fast_forwarded_rounds = 0
+        self.last_round = None
 
         # Call initialize on the strategies at the start of the game.
-        self.row_player.initialize(self.matrix_suite, "row")
-        self.col_player.initialize(self.matrix_suite, "col")
+        if self.profiler is None:
+            self.row_player.initialize(self.matrix_suite, "row")
+            self.col_player.initialize(self.matrix_suite, "col")
+        else:
+            start = perf_counter()
+            self.row_player.initialize(self.matrix_suite, "row")
+            middle = perf_counter()
+            self.col_player.initialize(self.matrix_suite, "col")
+            end = perf_counter()
+            self.profiler.add(type(self.row_player).__name__, "initialize", middle - start)
+            self.profiler.add(type(self.col_player).__name__, "initialize", end - middle)
 
     # Add methods that implement the logic of playing a game, so play one round and play x rounds.
     def play(self):
+        # Only games with a profiler time the steps, the others just check it is None
+        profiler = self.profiler
         # Increase the current round by 1
         self.round_ += 1
 
+        if profiler is not None:
+            t0 = perf_counter()
         # Get the action of the row player for the current round
         row_player_action = self.row_player.get_action(self.round_)
+        if profiler is not None:
+            t1 = perf_counter()
         # Get the action of the col player for the current round
         col_player_action = self.col_player.get_action(self.round_)
-
-        # Update the history of the actions by the row player
-        self.row_player_actions.append(row_player_action)
-        # Update the history of the actions by the col player
-        self.col_player_actions.append((col_player_action))
-
-        # Get the payoff of the row player for the current round
-        row_player_payoff = self.matrix_suite.payoff_matrix[row_player_action][col_player_action][0]
-        # Get the payoff of the col player for the current round
-        col_player_payoff = self.matrix_suite.payoff_matrix[row_player_action][col_player_action][1]
-
-        # Update the history of the payoffs by the row player
-        self.row_player_payoffs.append(row_player_payoff)
-        # Update the history of the payoffs by the col player
-        self.col_player_actions.append(col_player_payoff)
+        if profiler is not None:
+            t2 = perf_counter()
+
+        # Get the payoffs of the row player and the col player for the current round
+        row_player_payoff, col_player_payoff = self._payoff_matrix[row_player_action][col_player_action]
+        if profiler is not None:
+            t3 = perf_counter()
+
+        if self.streaming:
+            # Only update the running statistics, they have a fixed size
+            self.row_player_action_counts[row_player_action] += 1
+            self.col_player_action_counts[col_player_action] += 1
+            self.row_player_payoff_stats.add(row_player_payoff)
+            self.col_player_payoff_stats.add(col_player_payoff)
+        else:
+            # Update the history of the actions by the row player
+            self.row_player_actions.append(row_player_action)
+            # Update the history of the actions by the col player
+            self.col_player_actions.append(col_player_action)
+
+            # Update the history of the payoffs by the row player
+            self.row_player_payoffs.append(row_player_payoff)
+            # Update the history of the payoffs by the col player
+            self.col_player_payoffs.append(col_player_payoff)
+        if profiler is not None:
+            t4 = perf_counter()
 
         # Update the strategies for the row player and col player
         self.row_player.update(self.round_, row_player_action, row_player_payoff, col_player_action, col_player_payoff)
+        if profiler is not None:
+            t5 = perf_counter()
         self.col_player.update(self.round_, col_player_action, col_player_payoff, row_player_action, row_player_payoff)
-
-
+        if profiler is not None:
+            t6 = perf_counter()
+            row_player_name = type(self.row_player).__name__
+            col_player_name = type(self.col_player).__name__
+            profiler.add(row_player_name, "get_action", t1 - t0)
+            profiler.add(col_player_name, "get_action", t2 - t1)
+            profiler.add("Game", "payoff_lookup", t3 - t2)
+            profiler.add("Game", "bookkeeping", t4 - t3)
+            profiler.add(row_player_name, "update", t5 - t4)
+            profiler.add(col_player_name, "update", t6 - t5)
+
+        self.last_round = (row_player_action, col_player_action, row_player_payoff, col_player_payoff)
+
+    def play_rounds(self, rounds: int, fast_forward: bool = False) -> None:
+        """Play the given number of rounds.
+        :param fast_forward: Once the same joint action is played twice in a row and both strategies report that
+        they are locked into it (see Strategy.is_locked), the game can only repeat that round.
+        The remaining rounds are then added to the histories or statistics in closed form instead of played.
+        The strategies are left in the state of the last round that was actually played.
+        """
+        previous_round = None
+        for played in range(1, rounds + 1):
+            self.play()
+            if fast_forward and self.last_round == previous_round and self.is_locked():
+                self.repeat_last_round(rounds - played)
+                return
+            previous_round = self.last_round
+
+    def play_until_stable(self, tolerance: float, max_rounds: int, min_rounds: int = 2) -> int:
+        """Play rounds until the standard error of the average payoff of the row player drops below *tolerance*,
+        or until *max_rounds* rounds have been played. Returns the number of rounds played.
+        NOTE: The standard error assumes independent rounds, learning strategies make it an approximation.
+        :param tolerance: Target standard error of the average payoff of the row player.
+        :param max_rounds: Hard cap on the number of rounds.
+        :param min_rounds: Number of rounds that are always played, before the standard error is trusted.
+        """
+        row_player_payoff_stats = RunningStatistics()
+        for played in range(1, max_rounds + 1):
+            self.play()
+            row_player_payoff_stats.add(self.last_round[2])
+            if played >= min_rounds and row_player_payoff_stats.standard_error() < tolerance:
+                return played
+        return max_rounds
+
+    def is_locked(self) -> bool:
+        """Check if both strategies will keep playing the joint action of the last round forever."""
+        if self.last_round is None:
+            return False
+        row_player_action, col_player_action, _, _ = self.last_round
+        return (self.row_player.is_locked(row_player_action, col_player_action)
+                and self.col_player.is_locked(col_player_action, row_player_action))
+
+    def repeat_last_round(self, rounds: int) -> None:
+        """Record the last round another *rounds* times, without asking or updating the strategies."""
+        row_player_action, col_player_action, row_player_payoff, col_player_payoff = self.last_round
+        self.round_ += rounds
+        self.fast_forwarded_rounds += rounds
+        if self.streaming:
+            self.row_player_action_counts[row_player_action] += rounds
+            self.col_player_action_counts[col_player_action] += rounds
+            self.row_player_payoff_stats.add_repeated(row_player_payoff, rounds)
+            self.col_player_payoff_stats.add_repeated(col_player_payoff, rounds)
+        else:
+            self.row_player_actions.extend([row_player_action] * rounds)
+            self.col_player_actions.extend([col_player_action] * rounds)
+            self.row_player_payoffs.extend([row_player_payoff] * rounds)
+            self.col_player_payoffs.extend([col_player_payoff] * rounds)
+
+    def row_player_mean_payoff(self) -> float:
+        """Average payoff per round of the row player, in O(1) when streaming."""
+        if self.streaming:
+            return self.row_player_payoff_stats.total / self.row_player_payoff_stats.count
+        return mean(self.row_player_payoffs)
+
+    def col_player_mean_payoff(self) -> float:
+        """Average payoff per round of the column player, in O(1) when streaming."""
+        if self.streaming:
+            return self.col_player_payoff_stats.total / self.col_player_payoff_stats.count
+        return mean(self.col_player_payoffs)
@@ -3,13 +3,24 @@
 # it just has to calculate the grand table on a matrix suite,
 #  given a list of strategies, restarts and rounds per restart.
 import copy
+import multiprocessing
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
 from statistics import mean
 
-from typing import List
+from typing import List, Optional, Tuple
+
+import numpy as np
 
 import MatrixSuite
+from BatchedStrategies import BatchedStrategyGame, batched_strategy
+from Distributed import Coordinator, run_worker
 from Game import Game
+from Profiler import Profiler
 from Strategies import Strategy
+from Utils import BatchedRandomStream, RandomStream, describe, fingerprint
 
 
 class GrandTable:
@@ -26,6 +37,9 @@ class GrandTable:
         Either row or col strategies should be a deepcopy of strategies so they don't refer to the same instances.
         Credit: Thanks Vincent and Wiebe for noticing that this is necessary.
 
+        For the same reason every game gets its own copy of both strategies,
+        otherwise a row strategy would share its state with all the N games in its row.
+
         *restarts*: Number of restarts that should occur during the calculation of the Grand Table.
 
         *rounds*: Number of rounds that should be played for each restart.
@@ -34,6 +48,33 @@ class GrandTable:
         The outer list are row players and the inner list are column players.
 
         *grand_table*: Same 2D list as *games* but only contains the resulting score.
+
+        *streaming*: If True the games only keep running statistics instead of their full history,
+        so the memory use doesn't grow with the number of rounds.
+
+        *fast_forward*: If True every game stops simulating once both strategies are locked into one joint action,
+        and fills in its remaining rounds in closed form (see Game.play_rounds).
+        The games are then played one after the other instead of round by round,
+        so the random numbers are drawn in a different order than without it.
+
+        *common_random_numbers*: Only used by the seeded modes (*play_parallel*, *add_strategy*).
+        Normally both strategies of every cell get their own RandomStream seeded from the cell.
+        If True the streams only depend on the restart and the column strategy,
+        so all cells in a column share the same random numbers,
+        which lowers the variance of the differences between the row strategies.
+
+        *profiler*: Optional Profiler shared by all games, so it adds up the time of the whole grand table.
+        The seeded modes that play in other processes (*play_parallel*, *play_distributed*, *add_strategy*)
+        profile every cell on its own and merge the profiles into it.
+        The batched modes (*play_vectorized*, *play_batched*) aren't profiled.
+
+        *rounds_used*: Same 2D list as *grand_table* but with the total number of rounds every cell played
+        over all restarts, only set by *play_adaptive*.
+
+        *restart_suites*: Snapshot of the matrix suite of every restart, only set by *play_parallel*.
+
+        *seed*: Master seed of the cells, only set by *play_parallel*.
+        Together with *restart_suites* it lets *add_strategy* play just the new cells.
     """
     matrix_suite: MatrixSuite
     row_strategies: List[Strategy]
@@ -42,13 +83,28 @@ class GrandTable:
     rounds: int
     games: List[List[Game]]
     grand_table: List[List[float]]
+    streaming: bool
+    fast_forward: bool
+    common_random_numbers: bool
+    profiler: Optional[Profiler]
+    rounds_used: List[List[int]]
+    restart_suites: List[MatrixSuite.MatrixSuite]
+    seed: int
 
     def __init__(self, matrix_suite: MatrixSuite, strategies: List[Strategy],
-                 nr_of_restarts: int, rounds_per_restart: int) -> None:
-        self.row_strategies = strategies
+                 nr_of_restarts: int, rounds_per_restart: int,
+                 streaming: bool = False, fast_forward: bool = False, common_random_numbers: bool = False,
+                 profiler: Optional[Profiler] = None) -> None:
+        # A copy of the list, as add_strategy and remove_strategy change it
+        self.row_strategies = list(strategies)
         self.col_strategies = copy.deepcopy(strategies)
         self.matrix_suite = matrix_suite
-        self.games = [[Game(self.matrix_suite, row_player, col_player)
+        self.streaming = streaming
+        self.fast_forward = fast_forward
+        self.common_random_numbers = common_random_numbers
+        self.profiler = profiler
+        self.games = [[Game(self.matrix_suite, copy.deepcopy(row_player), copy.deepcopy(col_player),
+                            streaming, profiler)
                        for col_player in self.col_strategies]
                       for row_player in self.row_strategies]
         self.grand_table = [[0
@@ -90,24 +146,40 @@ class GrandTable:
         return out
 
     # Methods to play all games for the specified number of rounds and handle the restarts, can go here.
-    def play(self):
+    def play(self, checkpoint_path: Optional[str] = None, checkpoint_every: int = 1):
+        """Play all games for every restart and calculate the grand table.
+
+        :param checkpoint_path: If given, a checkpoint is written to this file every *checkpoint_every* restarts,
+        and if the file already exists the run resumes from it.
+        A resumed run gives the same grand table as a run that never stopped. The file is removed when done.
+        :param checkpoint_every: Number of restarts between checkpoints.
+        """
+        first_restart = 0
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            first_restart = self.load_checkpoint(checkpoint_path)
 
         # Iterate through the number of restarts that should occur during the calculation of the Grand Table
-        for curr_restart in range(self.restarts + 1):
+        for curr_restart in range(first_restart, self.restarts + 1):
             print(self.matrix_suite)
 
-            # Iterate through the number of rounds that should be played for each restart
-            for curr_round in range(self.rounds):
-                # Iterate through every combination of strategies (every game), so N x N
+            if self.fast_forward:
+                # Play every game on its own, so it can skip its remaining rounds once it is locked
                 for curr_row_of_games in self.games:
                     for curr_game in curr_row_of_games:
-                        # Play one combination of strategies once
-                        curr_game.play()
+                        curr_game.play_rounds(self.rounds, fast_forward=True)
+            else:
+                # Iterate through the number of rounds that should be played for each restart
+                for curr_round in range(self.rounds):
+                    # Iterate through every combination of strategies (every game), so N x N
+                    for curr_row_of_games in self.games:
+                        for curr_game in curr_row_of_games:
+                            # Play one combination of strategies once
+                            curr_game.play()
 
             # Calculate the average payoff for every combination of strategies for the row player before restart
             for i, row_of_games in enumerate(self.games):
                 for j, game in enumerate(row_of_games):
-                    row_player_avg_payoff = mean(game.row_player_payoffs)
+                    row_player_avg_payoff = game.row_player_mean_payoff()
                     # Record the sum of the average payoff by every restart in the Grand Table
                     self.grand_table[i][j] += row_player_avg_payoff
 
@@ -120,7 +192,337 @@ class GrandTable:
                     # Play the new matrix suite (game)
                     game.initialize(self.matrix_suite)
 
+            if checkpoint_path is not None and (curr_restart + 1) % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path, curr_restart + 1)
+
         # Calculate the score in the Grand Table
         for i, row in enumerate(self.grand_table):
             for j, score in enumerate(row):
-                self.grand_table[i][j] = score / (self.restarts + 1)
\ No newline at end of file
+                self.grand_table[i][j] = score / (self.restarts + 1)
+
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def save_checkpoint(self, path: str, next_restart: int) -> None:
+        """Save everything *play* needs to continue from the given restart:
+        the partial grand table, the matrix suite (with its *k*), the games with their strategies
+        and the state of the random number generator.
+        The file is replaced atomically, so a crash while writing keeps the previous checkpoint."""
+        state = {
+            "config": self._checkpoint_config(),
+            "next_restart": next_restart,
+            "grand_table": self.grand_table,
+            "matrix_suite": self.matrix_suite,
+            "games": self.games,
+            "random_state": random.getstate(),
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(temp_path, path)
+
+    def load_checkpoint(self, path: str) -> int:
+        """Restore the state saved by *save_checkpoint* and return the restart to continue from."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state["config"] != self._checkpoint_config():
+            raise Exception("Checkpoint " + path + " was made for a different grand table configuration.")
+        self.grand_table = state["grand_table"]
+        self.matrix_suite = state["matrix_suite"]
+        self.games = state["games"]
+        random.setstate(state["random_state"])
+        return state["next_restart"]
+
+    def _checkpoint_config(self) -> tuple:
+        """The settings a checkpoint has to match before it can be resumed,
+        including the parameters of the strategies and the settings of the matrix suite."""
+        return (self.matrix_suite.configuration(),
+                [describe(strategy) for strategy in self.row_strategies],
+                self.restarts, self.rounds, self.streaming, self.fast_forward)
+
+    def play_adaptive(self, tolerance: float, max_rounds: Optional[int] = None, min_rounds: int = 50):
+        """Same as *play*, but every game stops once the standard error of the average payoff of its row player
+        drops below *tolerance* (see Game.play_until_stable), so only the noisy cells get many rounds.
+        The number of rounds every cell used is recorded in *rounds_used*.
+
+        :param tolerance: Target standard error of the average payoff of every cell.
+        :param max_rounds: Hard cap on the rounds of every game, by default the rounds per restart.
+        :param min_rounds: Number of rounds every game plays before it can stop.
+        """
+        if max_rounds is None:
+            max_rounds = self.rounds
+        self.rounds_used = [[0
+                             for _ in self.col_strategies]
+                            for _ in self.row_strategies]
+
+        for curr_restart in range(self.restarts + 1):
+            print(self.matrix_suite)
+
+            for i, row_of_games in enumerate(self.games):
+                for j, game in enumerate(row_of_games):
+                    self.rounds_used[i][j] += game.play_until_stable(tolerance, max_rounds, min_rounds)
+                    # Record the sum of the average payoff by every restart in the Grand Table
+                    self.grand_table[i][j] += game.row_player_mean_payoff()
+
+            if curr_restart < self.restarts:
+                # Generate the new matrix suite (game)
+                self.matrix_suite.generate_new_payoff_matrix()
+
+            for row_of_games in self.games:
+                for game in row_of_games:
+                    # Play the new matrix suite (game)
+                    game.initialize(self.matrix_suite)
+
+        # Calculate the score in the Grand Table
+        for i, row in enumerate(self.grand_table):
+            for j, score in enumerate(row):
+                self.grand_table[i][j] = score / (self.restarts + 1)
+
+    def play_batched(self, seed: int, restarts_per_batch: Optional[int] = None):
+        """Same as *play_vectorized*, but play the cells of a few restarts at a time,
+        so the memory for the state of the games doesn't grow with the number of restarts.
+        Every cell keeps its own random streams, so the grand table is the same as that of *play_vectorized*
+        (and *play_parallel*) for the same seed, whatever the number of restarts per batch.
+
+        :param seed: Master seed for the matrices of the restarts and the seeds of the cells.
+        :param restarts_per_batch: Number of restarts played together, by default all of them.
+        Every round costs a few array operations per strategy however many games it has,
+        so larger batches are faster.
+        """
+        self._play_seeded(seed, vectorized=True, restarts_per_batch=restarts_per_batch)
+
+    def play_parallel(self, seed: int, workers: Optional[int] = None):
+        """Same as *play*, but spread the games of every (restart, row, col) cell over a pool of processes.
+        Every cell is seeded with its own seed derived from *seed*,
+        so the grand table is the same no matter how many workers play it.
+
+        :param seed: Master seed for the matrices of the restarts and the seeds of the cells.
+        The first restart is played on the matrix the suite currently holds.
+        :param workers: Number of worker processes, by default one per CPU.
+        With 1 worker the cells are played in this process.
+        """
+        self._play_seeded(seed, workers=workers)
+
+    def play_vectorized(self, seed: int):
+        """Same as *play_parallel*, but play all (restart, row, col) cells at once in this process,
+        with one batched strategy (see BatchedStrategies.py) per row and per column of the table.
+        The cells use the same matrices and random streams, so the grand table is the same as that of
+        *play_parallel* with streaming, up to the rounding of the average for float payoffs without it.
+        Fast-forwarding is not used, as the batch plays every round of every cell anyway.
+
+        :param seed: Master seed for the matrices of the restarts and the seeds of the cells.
+        """
+        self._play_seeded(seed, vectorized=True)
+
+    def play_distributed(self, seed: int, address: Tuple[str, int] = ("localhost", 0), local_workers: int = 0,
+                         authkey: Optional[bytes] = None, unit_timeout: Optional[float] = None):
+        """Same as *play_parallel*, but hand out the (restart, row, col) cells over TCP to workers on any host
+        (see Distributed.py), which gives the same grand table.
+        A cell whose worker is lost is handed out again to another worker.
+
+        :param seed: Master seed for the matrices of the restarts and the seeds of the cells.
+        :param address: The (host, port) the coordinator listens on, port 0 picks a free port.
+        Use ("0.0.0.0", port) to accept workers from other hosts.
+        :param local_workers: Number of worker processes to start on this machine.
+        :param authkey: Shared key the workers need to connect, by default MAL_AUTHKEY or else a random key,
+        which is printed when the address can be reached from other hosts.
+        :param unit_timeout: Seconds a worker gets for one cell before it is considered lost.
+        """
+        coordinator = Coordinator(address, authkey, unit_timeout)
+        print("Coordinator listening on", coordinator.address)
+        processes = [multiprocessing.Process(target=run_worker, args=(coordinator.address, coordinator.authkey))
+                     for _ in range(local_workers)]
+        for process in processes:
+            process.start()
+        try:
+            self._play_seeded(seed, coordinator=coordinator)
+        finally:
+            for process in processes:
+                process.join()
+
+    def _play_seeded(self, seed: int, workers: Optional[int] = None, coordinator: Optional[Coordinator] = None,
+                     vectorized: bool = False, restarts_per_batch: Optional[int] = None):
+        """Play every cell with its own seed, see *play_parallel*, *play_vectorized* and *play_batched*."""
+        # Generate the matrices of all restarts up front, so every worker can play any restart
+        random.seed(seed)
+        self.restart_suites = []
+        for curr_restart in range(self.restarts + 1):
+            print(self.matrix_suite)
+            self.restart_suites.append(self.matrix_suite.snapshot())
+            if curr_restart < self.restarts:
+                self.matrix_suite.generate_new_payoff_matrix()
+
+        self.seed = seed
+        cells = [(curr_restart, i, j)
+                 for curr_restart in range(self.restarts + 1)
+                 for i in range(len(self.row_strategies))
+                 for j in range(len(self.col_strategies))]
+        if vectorized:
+            # The cells are in restart order, so every batch holds whole restarts
+            cells_per_restart = len(self.row_strategies) * len(self.col_strategies)
+            cells_per_batch = (restarts_per_batch or self.restarts + 1) * cells_per_restart
+            results = []
+            for first_cell in range(0, len(cells), cells_per_batch):
+                results += self._play_cells_vectorized(cells[first_cell:first_cell + cells_per_batch])
+        else:
+            results = self._play_cells(cells, workers, coordinator)
+        # Add up the restarts in a fixed order, so the rounding doesn't depend on the workers either
+        for (_, i, j), row_player_avg_payoff in zip(cells, results):
+            self.grand_table[i][j] += row_player_avg_payoff
+
+        for row_of_games in self.games:
+            for game in row_of_games:
+                game.initialize(self.matrix_suite)
+
+        # Calculate the score in the Grand Table
+        for i, row in enumerate(self.grand_table):
+            for j, score in enumerate(row):
+                self.grand_table[i][j] = score / (self.restarts + 1)
+
+    def _play_cells(self, cells: List[Tuple[int, int, int]], workers: Optional[int] = None,
+                    coordinator: Optional[Coordinator] = None) -> List[float]:
+        """Play the given (restart, row, col) cells, with a pool of processes unless *workers* is 1,
+        or on the workers of the coordinator if one is given. The profiles of the cells are merged into *profiler*.
+        Return the average payoff of the row player of every cell in the same order."""
+        seeds = self._cell_seeds(cells)
+        stream_seeds = self._stream_seeds(cells, seeds)
+        args = ([self.restart_suites[curr_restart] for curr_restart, _, _ in cells],
+                [self.row_strategies[i] for _, i, _ in cells],
+                [self.col_strategies[j] for _, _, j in cells],
+                [self.rounds] * len(cells),
+                seeds,
+                [self.streaming] * len(cells),
+                [self.fast_forward] * len(cells),
+                stream_seeds,
+                [self.profiler is not None] * len(cells))
+
+        if coordinator is not None:
+            results = coordinator.run(play_cell, list(zip(*args)))
+        elif workers == 1:
+            results = list(map(play_cell, *args))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(play_cell, *args, chunksize=max(1, len(cells) // (4 * workers))))
+
+        for _, profiler in results:
+            if profiler is not None:
+                self.profiler.merge(profiler)
+        return [row_player_avg_payoff for row_player_avg_payoff, _ in results]
+
+    def _play_cells_vectorized(self, cells: List[Tuple[int, int, int]]) -> List[float]:
+        """Play the given (restart, row, col) cells at once with batched strategies,
+        with the same random streams as *play_cell*. Return the average payoff of the row player of every cell."""
+        stream_seeds = self._stream_seeds(cells, self._cell_seeds(cells))
+        row_groups = []
+        for i, strategy in enumerate(self.row_strategies):
+            games = [g for g, (_, row, _) in enumerate(cells) if row == i]
+            if games:
+                row_player = batched_strategy(strategy)
+                row_player.set_random_streams(BatchedRandomStream(
+                    [np.random.SeedSequence([stream_seeds[g], 0]) for g in games]))
+                row_groups.append((row_player, games))
+        col_groups = []
+        for j, strategy in enumerate(self.col_strategies):
+            games = [g for g, (_, _, col) in enumerate(cells) if col == j]
+            if games:
+                col_player = batched_strategy(strategy)
+                col_player.set_random_streams(BatchedRandomStream(
+                    [np.random.SeedSequence([stream_seeds[g], 1]) for g in games]))
+                col_groups.append((col_player, games))
+
+        batched_game = BatchedStrategyGame([self.restart_suites[curr_restart] for curr_restart, _, _ in cells],
+                                           row_groups, col_groups)
+        batched_game.play_rounds(self.rounds)
+        return batched_game.row_player_mean_payoffs().tolist()
+
+    def _cell_seeds(self, cells: List[Tuple[int, int, int]]) -> List[int]:
+        return [cell_seed(self.seed, curr_restart, self.row_strategies[i], self.col_strategies[j])
+                for curr_restart, i, j in cells]
+
+    def _stream_seeds(self, cells: List[Tuple[int, int, int]], seeds: List[int]) -> List[int]:
+        """Seeds of the random streams of the cells, shared by a column with common random numbers."""
+        if self.common_random_numbers:
+            return [common_seed(self.seed, curr_restart, self.col_strategies[j]) for curr_restart, _, j in cells]
+        return seeds
+
+    def add_strategy(self, strategy: Strategy, workers: Optional[int] = None) -> None:
+        """Add a strategy as the last row and column of a grand table played by *play_parallel*.
+        Only the 2N + 1 new cells are played, on the same matrices and with the same cell seeds,
+        so the result is the same as playing the whole table with the new strategy from the start.
+        :param workers: Number of worker processes, as in *play_parallel*.
+        """
+        if not hasattr(self, "restart_suites"):
+            raise Exception("add_strategy needs a grand table that was played by play_parallel.")
+        self.row_strategies.append(strategy)
+        self.col_strategies.append(copy.deepcopy(strategy))
+        n = len(self.row_strategies) - 1
+
+        # The new row (including the new strategy against itself) and the new column
+        cells = [(curr_restart, i, j)
+                 for curr_restart in range(self.restarts + 1)
+                 for i, j in [(n, col) for col in range(n + 1)] + [(row, n) for row in range(n)]]
+        scores = {}
+        for (_, i, j), row_player_avg_payoff in zip(cells, self._play_cells(cells, workers)):
+            scores[i, j] = scores.get((i, j), 0) + row_player_avg_payoff
+
+        for i, row in enumerate(self.grand_table):
+            row.append(scores[i, n] / (self.restarts + 1))
+        self.grand_table.append([scores[n, j] / (self.restarts + 1) for j in range(n + 1)])
+
+        for i, row_of_games in enumerate(self.games):
+            row_of_games.append(Game(self.matrix_suite, copy.deepcopy(self.row_strategies[i]),
+                                     copy.deepcopy(strategy), self.streaming, self.profiler))
+        self.games.append([Game(self.matrix_suite, copy.deepcopy(strategy), copy.deepcopy(col_player),
+                                self.streaming, self.profiler)
+                           for col_player in self.col_strategies])
+
+    def remove_strategy(self, index: int) -> None:
+        """Remove the row and column of the strategy at *index* from a grand table played by *play_parallel*,
+        nothing is played. As the cell seeds depend on the strategies and not on their position,
+        the result is still the same as playing the table without that strategy."""
+        if not hasattr(self, "restart_suites"):
+            raise Exception("remove_strategy needs a grand table that was played by play_parallel.")
+        del self.row_strategies[index]
+        del self.col_strategies[index]
+        del self.games[index]
+        del self.grand_table[index]
+        for row_of_games, row in zip(self.games, self.grand_table):
+            del row_of_games[index]
+            del row[index]
+
+
+def cell_seed(seed: int, restart: int, row_player: Strategy, col_player: Strategy) -> int:
+    """Derive the seed of one (restart, row, col) cell of the grand table from the master seed.
+    The strategies are identified by their class and parameters rather than their position in the table,
+    so a cell keeps its seed when strategies are added or removed."""
+    return int(np.random.SeedSequence([seed, restart, fingerprint(row_player), fingerprint(col_player)])
+               .generate_state(1)[0])
+
+
+def common_seed(seed: int, restart: int, col_player: Strategy) -> int:
+    """Derive the seed of the random streams shared by all cells in a column, for common random numbers."""
+    return int(np.random.SeedSequence([seed, restart, fingerprint(col_player)]).generate_state(1)[0])
+
+
+def play_cell(matrix_suite: MatrixSuite, row_player: Strategy, col_player: Strategy,
+              rounds: int, seed: int, streaming: bool = False, fast_forward: bool = False,
+              stream_seed: Optional[int] = None, profile: bool = False) -> Tuple[float, Optional[Profiler]]:
+    """Play a single game with fresh copies of the strategies.
+    This is a module level function so it can be sent to worker processes.
+    :param seed: Seed of the cell, for the random module.
+    :param stream_seed: Seed of the RandomStreams of the two strategies, by default the seed of the cell.
+    :param profile: Profile the game with its own Profiler.
+    :return: The average payoff of the row player and the Profiler of the game (None without *profile*).
+    """
+    random.seed(seed)
+    if stream_seed is None:
+        stream_seed = seed
+    row_player = copy.deepcopy(row_player)
+    col_player = copy.deepcopy(col_player)
+    row_player.set_random_stream(RandomStream(np.random.SeedSequence([stream_seed, 0])))
+    col_player.set_random_stream(RandomStream(np.random.SeedSequence([stream_seed, 1])))
+    profiler = Profiler() if profile else None
+    game = Game(matrix_suite, row_player, col_player, streaming, profiler)
+    game.play_rounds(rounds, fast_forward)
+    return game.row_player_mean_payoff(), profiler
@@ -0,0 +1,141 @@
+# NOTE: A cache of computed grand tables on the local disk.
+# Every configuration is stored under a hash of everything that determines its grand table,
+# so a repeated configuration is loaded instead of played again.
+
+import hashlib
+import json
+import os
+import random
+import sys
+from typing import Any, List, Optional
+
+import MatrixSuite
+from GrandTable import GrandTable
+from Strategies import Strategy
+from Utils import describe
+
+
+class GrandTableCache:
+    """Content-addressed cache of grand tables, stored as one JSON file per configuration.
+    When the files take up more than *max_bytes*, the least recently used ones are removed.
+
+    Class attributes:
+        *directory*: Folder the cached grand tables are stored in.
+
+        *max_bytes*: Maximum total size of the cached files.
+
+        *hits*: Number of configurations that were loaded from the cache.
+
+        *misses*: Number of configurations that had to be played.
+    """
+    directory: str
+    max_bytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, directory: str = ".grand_table_cache", max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def play(self, matrix_suite: MatrixSuite, strategies: List[Strategy], restarts: int, rounds: int,
+             seed: int, **options: Any) -> GrandTable:
+        """Return the GrandTable of the given configuration, from the cache if possible.
+        Otherwise the random module is seeded with *seed*, the table is played and stored.
+        On a hit the matrix suite still generates the matrices of the restarts after seeding the random module,
+        so it ends on the same matrix as after playing, if it draws them from its own stream (it has a seed)
+        or doesn't draw them at all. Suites without a seed draw from the random module in between the strategies,
+        so only playing can bring them (and the random module) to the same state.
+        :param options: Extra keyword arguments for GrandTable, i.e. fast_forward, which are part of the key.
+        """
+        # The key has to be made before playing, as playing changes the matrix suite
+        key = cache_key(matrix_suite, strategies, restarts, rounds, seed, **options)
+        grand_table = GrandTable(matrix_suite, strategies, restarts, rounds, **options)
+
+        table = self.get(key)
+        if table is not None:
+            self.hits += 1
+            grand_table.grand_table = table
+            random.seed(seed)
+            for _ in range(restarts):
+                matrix_suite.generate_new_payoff_matrix()
+            return grand_table
+
+        self.misses += 1
+        random.seed(seed)
+        grand_table.play()
+        self.put(key, grand_table.grand_table)
+        return grand_table
+
+    def get(self, key: str) -> Optional[List[List[float]]]:
+        """Load the grand table stored under *key*, or return None if it isn't cached."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                table = json.load(f)["grand_table"]
+        except (OSError, ValueError, KeyError):
+            return None
+        # Mark it as recently used
+        os.utime(path)
+        return table
+
+    def put(self, key: str, table: List[List[float]]) -> None:
+        """Store a grand table under *key* and evict the least recently used tables if the cache is too big."""
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"grand_table": table}, f)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used tables until the cache fits in *max_bytes*."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total_size <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total_size -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+
+def cache_key(matrix_suite: MatrixSuite, strategies: List[Strategy], restarts: int, rounds: int,
+              seed: int, **options: Any) -> str:
+    """Hash everything that determines a grand table:
+    the matrix suite (including its current matrix), the classes and parameters of the strategies,
+    the number of restarts and rounds, the seed, any extra GrandTable options
+    and the code that plays it (see *source_hash*)."""
+    module_names = [type(matrix_suite).__module__] + [type(strategy).__module__ for strategy in strategies]
+    description = [describe(matrix_suite),
+                   [describe(strategy) for strategy in strategies],
+                   restarts, rounds, seed, sorted(options.items()),
+                   source_hash(module_names)]
+    return hashlib.sha256(repr(description).encode()).hexdigest()
+
+
+# The modules that play a grand table, the source of any module of a matrix suite or strategy is added to them
+played_by = ["Game", "GrandTable", "MatrixSuite", "Strategies", "Utils"]
+
+
+def source_hash(module_names: List[str]) -> str:
+    """Hash of the source files of the modules that play a grand table and of the given modules,
+    so tables played before the code changed aren't used. Modules without a file (i.e. an interactive session)
+    are left out."""
+    digest = hashlib.sha256()
+    for name in sorted(set(played_by + module_names)):
+        path = getattr(sys.modules[name], "__file__", None)
+        if path is not None:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
@@ -1,14 +1,21 @@
 # Note: From this script the program can be run.
 # You may change everything about this file.
 
+import random
+
 import MatrixSuite
 import Strategies
 import Game
-from GrandTable import GrandTable
+from GrandTableCache import GrandTableCache
 import ReplicatorDynamic
 import Nash
 from typing import List
 
+# Seed the random module before generating the first matrices,
+# so every run of an option gives the same grand table and it can be loaded from the cache.
+seed = 2020
+random.seed(seed)
+
 eight_strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0),
                     Strategies.SatisficingPlay(0.1, 2.0), Strategies.Bully(), Strategies.FictitiousPlay(),
                     Strategies.RegretMatching(), Strategies.Softmax(5.0, 0.1, 1.0)]
@@ -21,13 +28,18 @@ fixed_matrix_suite = MatrixSuite.FixedMatrixSuite()
 random_int_matrix_suite = MatrixSuite.RandomIntMatrixSuite()
 random_float_matrix_suite = MatrixSuite.RandomFloatMatrixSuite()
 
+# Set to a .png or .svg file to save the replicator dynamic graph without opening a window.
+graph_output = None
+
+# Options that only differ in the starting proportions share the same grand table, so keep the tables on disk.
+grand_table_cache = GrandTableCache()
+
 def generate_grand_table(matrix_suite: MatrixSuite, strategies: List[Strategies.Strategy], restarts: int):
      matrix_suite = matrix_suite
      strategies = strategies
      print("Strategies:", strategies)
 
-     grand_table = GrandTable(matrix_suite, strategies, restarts, 1000)
-     grand_table.play()
+     grand_table = grand_table_cache.play(matrix_suite, strategies, restarts, 1000, seed)
      print(grand_table)
 
      return grand_table
@@ -81,7 +93,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -96,7 +108,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -111,7 +123,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
@@ -126,7 +138,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
@@ -141,7 +153,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -156,7 +168,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -171,7 +183,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
@@ -186,7 +198,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
@@ -201,7 +213,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -216,7 +228,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_without_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(eight_strategies, grand_table)
@@ -231,7 +243,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
@@ -246,7 +258,7 @@ if __name__ == "__main__":
           replicator_dynamic = ReplicatorDynamic.ReplicatorDynamic(ReplicatorDynamic.non_uniform_with_own_strat,
                                                                    grand_table)
           replicator_dynamic.evolve()
-          replicator_dynamic.to_graph()
+          replicator_dynamic.to_graph(graph_output)
 
           # Nash equilibrium
           Nash.nash_equilibria(nine_strategies, grand_table)
\ No newline at end of file
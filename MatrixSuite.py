@@ -5,8 +5,14 @@
 # You may not change the actions and payoffs of the matrix games in FixedMatrixSuite, only their representation.
 
 import abc
+import os
 import random
-from typing import List, Tuple, Dict
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from Utils import describe
 
 # Define custom types for actions and payoffs.
 Payoff = float
@@ -33,11 +39,48 @@ class MatrixSuite(metaclass=abc.ABCMeta):
 
         The first item of the tuple is the row player payoff,
         the second item is the column player payoff.
+
+        *payoff_array*: The same payoffs as a float array of shape (R, C, 2), set together with *payoff_matrix*.
+        A suite can set either one, the other is derived from it. Treat both as read-only.
+
+        *row_view*: *payoff_array* seen from the row player, shape (R, C, 2) with its own payoff first.
+
+        *col_view*: *payoff_array* seen from the column player, shape (C, R, 2) with its own payoff first.
+        Both views share the memory of *payoff_array*, they are not copies.
     """
     name: str
     row_actions: List[Action]
     col_actions: List[Action]
-    payoff_matrix: List[List[Tuple[Payoff, Payoff]]]
+    payoff_array: np.ndarray
+
+    @property
+    def payoff_matrix(self) -> List[List[Tuple[Payoff, Payoff]]]:
+        """The payoff matrix as a 2D list of tuples, built from *payoff_array* if the suite only set that."""
+        if getattr(self, "_payoff_matrix_array", None) is not self.payoff_array:
+            self._payoff_matrix = [[tuple(payoffs) for payoffs in row] for row in self.payoff_array.tolist()]
+            self._payoff_matrix_array = self.payoff_array
+        return self._payoff_matrix
+
+    @payoff_matrix.setter
+    def payoff_matrix(self, payoff_matrix: List[List[Tuple[Payoff, Payoff]]]) -> None:
+        self.payoff_array = np.array(payoff_matrix, dtype=float).reshape(len(payoff_matrix), -1, 2)
+        self._payoff_matrix = payoff_matrix
+        self._payoff_matrix_array = self.payoff_array
+
+    @property
+    def row_view(self) -> np.ndarray:
+        return self.payoff_array
+
+    @property
+    def col_view(self) -> np.ndarray:
+        return self.payoff_array.transpose(1, 0, 2)[:, :, ::-1]
+
+    def player_view(self, player: str) -> np.ndarray:
+        """Return *row_view* or *col_view*.
+        :param player: A string of either 'row' or 'col'.
+        """
+        self.get_actions(player)  # Raises for an invalid player
+        return self.row_view if player == "row" else self.col_view
 
     @abc.abstractmethod
     def generate_new_payoff_matrix(self) -> None:
@@ -68,6 +111,88 @@ class MatrixSuite(metaclass=abc.ABCMeta):
         else:
             raise Exception("ERROR: *player* should be either 'row' of 'col', not '" + player + "'!")
 
+    def player_payoffs(self, player: str) -> "PlayerPayoffs":
+        """Return the payoff matrix seen from the given player, with the data the strategies derive from it.
+        It is computed once per payoff matrix and shared by every strategy that plays it, so treat it as read-only.
+        :param player: A string of either 'row' or 'col'.
+        """
+        if getattr(self, "_player_payoffs_matrix", None) is not self.payoff_matrix:
+            # A new payoff matrix was generated since the last call
+            self._player_payoffs_matrix = self.payoff_matrix
+            self._player_payoffs = {}
+        if player not in self._player_payoffs:
+            self.get_actions(player)  # Raises for an invalid player
+            self._player_payoffs[player] = PlayerPayoffs(self.payoff_matrix, player)
+        return self._player_payoffs[player]
+
+    def configuration(self) -> tuple:
+        """Describe the suite by its class and settings (see Utils.describe), leaving out *k* and the current matrix,
+        so the description stays the same while the suite generates new matrices."""
+        module, name, attributes = describe(self)
+        current_matrix = ("k", "row_actions", "col_actions", "payoff_matrix", "payoff_array")
+        return module, name, [(key, value) for key, value in attributes if key not in current_matrix]
+
+    def snapshot(self) -> "MatrixSuite":
+        """Return a frozen copy of the current payoff matrix,
+        so it can still be played after this suite has generated a new one (or in another process)."""
+        return StaticMatrixSuite(self)
+
+
+class PlayerPayoffs:
+    """A payoff matrix seen from one player, plus the data strategies derive from it. See MatrixSuite.player_payoffs.
+    Action *a* is always an action of the player and *o* an action of the opponent.
+
+    Class attributes:
+        *matrix*: The payoff matrix with the player's actions as rows (transposed for the col player).
+        The tuples keep the (row payoff, col payoff) order.
+
+        *payoffs*: payoffs[a][o] is the payoff of the player.
+
+        *opp_payoffs*: opp_payoffs[a][o] is the payoff of the opponent.
+
+        *potential_payoffs*: potential_payoffs[o][a] is the payoff of the player for each action against *o*.
+
+        *best_responses*: best_responses[o] are the actions with the highest payoff against *o*.
+
+        *security_values*: security_values[a] is the lowest payoff of *a* when the opponent plays a best response to it.
+
+        *min_payoff*: The lowest payoff the player can get.
+
+        *max_payoff*: The highest payoff the player can get.
+    """
+    matrix: List[List[Tuple[Payoff, Payoff]]]
+    payoffs: List[List[Payoff]]
+    opp_payoffs: List[List[Payoff]]
+    potential_payoffs: List[List[Payoff]]
+    best_responses: List[Tuple[Action, ...]]
+    security_values: List[Payoff]
+    min_payoff: Payoff
+    max_payoff: Payoff
+
+    def __init__(self, payoff_matrix: List[List[Tuple[Payoff, Payoff]]], player: str) -> None:
+        if player == "row":
+            self.matrix = payoff_matrix
+            own, opp = 0, 1
+        else:
+            self.matrix = [list(column) for column in zip(*payoff_matrix)]
+            own, opp = 1, 0
+        self.payoffs = [[payoffs[own] for payoffs in row] for row in self.matrix]
+        self.opp_payoffs = [[payoffs[opp] for payoffs in row] for row in self.matrix]
+        self.potential_payoffs = [list(column) for column in zip(*self.payoffs)]
+
+        self.best_responses = []
+        for column in self.potential_payoffs:
+            max_payoff = max(column)
+            self.best_responses.append(tuple(a for a, payoff in enumerate(column) if payoff == max_payoff))
+
+        self.security_values = []
+        for row, opp_row in zip(self.payoffs, self.opp_payoffs):
+            max_opp_payoff = max(opp_row)
+            self.security_values.append(min(x for x, y in zip(row, opp_row) if y == max_opp_payoff))
+
+        self.min_payoff = min(min(row) for row in self.payoffs)
+        self.max_payoff = max(max(row) for row in self.payoffs)
+
 
 class FixedMatrixSuite(MatrixSuite):
     """Predetermined suite of matrices, don't use with more than 9 restarts, because it will run out of matrices.
@@ -133,10 +258,28 @@ class FixedMatrixSuite(MatrixSuite):
 
 
 class RandomIntMatrixSuite(MatrixSuite):
-    def __init__(self) -> None:
-        """Initialize the suite and 'generate' the first payoff matrix."""
+    """Random integer payoffs in [1, 3] and 2 to 5 actions per player.
+
+    Class attributes:
+        *k*: Number of the matrix that is currently active.
+
+        *seed*: None to draw the matrices one by one from the random module.
+        Otherwise they are taken from a RandomMatrixStream with this seed,
+        so the same seed always gives the same sequence of matrices, whatever else uses the random module.
+    """
+    k: int
+    seed: Optional[int]
+
+    def __init__(self, seed: Optional[int] = None, batch_size: int = 256) -> None:
+        """Initialize the suite and 'generate' the first payoff matrix.
+        :param batch_size: Number of matrices the RandomMatrixStream generates at once, when seeded.
+        The sequence of matrices depends on it, so keep it the same to get the same matrices.
+        """
         self.name = "Random Int Matrix Suite"
         self.k = 0
+        self.seed = seed
+        if seed is not None:
+            self._stream = RandomMatrixStream(seed, True, 1, 3, batch_size=batch_size)
         self.generate_new_payoff_matrix()
 
     def __repr__(self) -> str:
@@ -146,26 +289,60 @@ class RandomIntMatrixSuite(MatrixSuite):
         return out
 
     def generate_new_payoff_matrix(self) -> None:
+        if self.seed is not None:
+            self.set_matrix(self.k + 1)
+            return
         self.k += 1
         # Randomly choose the number of row actions from [2, 5]
         self.row_actions = list(range(random.randint(2, 5)))
         # Randomly choose the number of col actions from [2, 5]
         self.col_actions = list(range(random.randint(2, 5)))
         # Randomly generate the payoff matrix with the payoff from [1, 3]
-        self.payoff_matrix = []
+        payoff_matrix = []
         for row_action in self.row_actions:
             row = []
             for col_action in self.col_actions:
                 payoff_tuple = (random.randint(1, 3), random.randint(1, 3))
                 row.append(payoff_tuple)
-            self.payoff_matrix.append(row)
+            payoff_matrix.append(row)
+        # Setting the whole matrix at once also sets the payoff array
+        self.payoff_matrix = payoff_matrix
+
+    def set_matrix(self, k: int) -> None:
+        """Make matrix *k* (counting from 1) of a seeded suite the current one.
+        Any matrix of the sequence can be regenerated this way, without generating the ones before it."""
+        if self.seed is None:
+            raise Exception("Only a seeded suite can jump to a matrix.")
+        self.k = k
+        matrix = self._stream.matrix(k - 1)
+        self.row_actions = list(range(matrix.shape[0]))
+        self.col_actions = list(range(matrix.shape[1]))
+        self.payoff_matrix = [[tuple(payoffs) for payoffs in row] for row in matrix.tolist()]
 
 
 class RandomFloatMatrixSuite(MatrixSuite):
-    def __init__(self) -> None:
-        """Initialize the suite and 'generate' the first payoff matrix."""
+    """Random float payoffs in [0.0, 3.0] and 2 to 5 actions per player.
+
+    Class attributes:
+        *k*: Number of the matrix that is currently active.
+
+        *seed*: None to draw the matrices one by one from the random module.
+        Otherwise they are taken from a RandomMatrixStream with this seed,
+        so the same seed always gives the same sequence of matrices, whatever else uses the random module.
+    """
+    k: int
+    seed: Optional[int]
+
+    def __init__(self, seed: Optional[int] = None, batch_size: int = 256) -> None:
+        """Initialize the suite and 'generate' the first payoff matrix.
+        :param batch_size: Number of matrices the RandomMatrixStream generates at once, when seeded.
+        The sequence of matrices depends on it, so keep it the same to get the same matrices.
+        """
         self.name = "Random Float Matrix Suite"
         self.k = 0
+        self.seed = seed
+        if seed is not None:
+            self._stream = RandomMatrixStream(seed, False, 0.0, 3.0, batch_size=batch_size)
         self.generate_new_payoff_matrix()
 
     def __repr__(self) -> str:
@@ -175,16 +352,254 @@ class RandomFloatMatrixSuite(MatrixSuite):
         return out
 
     def generate_new_payoff_matrix(self) -> None:
+        if self.seed is not None:
+            self.set_matrix(self.k + 1)
+            return
         self.k += 1
         # Randomly choose the number of row actions from [2, 5]
         self.row_actions = list(range(random.randint(2, 5)))
         # Randomly choose the number of col actions from [2, 5]
         self.col_actions = list(range(random.randint(2, 5)))
         # Randomly generate the payoff matrix with the payoff from [1, 3]
-        self.payoff_matrix = []
+        payoff_matrix = []
         for row_action in self.row_actions:
             row = []
             for col_action in self.col_actions:
                 payoff_tuple = (random.uniform(0.0, 3.0), random.uniform(0.0, 3.0))
                 row.append(payoff_tuple)
-            self.payoff_matrix.append(row)
\ No newline at end of file
+            payoff_matrix.append(row)
+        # Setting the whole matrix at once also sets the payoff array
+        self.payoff_matrix = payoff_matrix
+
+    def set_matrix(self, k: int) -> None:
+        """Make matrix *k* (counting from 1) of a seeded suite the current one.
+        Any matrix of the sequence can be regenerated this way, without generating the ones before it."""
+        if self.seed is None:
+            raise Exception("Only a seeded suite can jump to a matrix.")
+        self.k = k
+        matrix = self._stream.matrix(k - 1)
+        self.row_actions = list(range(matrix.shape[0]))
+        self.col_actions = list(range(matrix.shape[1]))
+        self.payoff_matrix = [[tuple(payoffs) for payoffs in row] for row in matrix.tolist()]
+
+
+class RandomMatrixStream:
+    """A seeded, endless sequence of random payoff matrices, generated lazily in blocks of *batch_size*.
+    Every block is drawn in a few vectorized calls from its own generator, seeded with (seed, block number),
+    so any matrix can be generated on its own (see *matrix*) and different processes get the same sequence.
+    Iterating over the stream gives the matrices in order.
+
+    Class attributes:
+        *seed*: The seed of the sequence.
+
+        *integer*: True for integer payoffs, False for uniform float payoffs.
+
+        *low*: Lowest possible payoff.
+
+        *high*: Highest possible payoff.
+
+        *min_actions*: Lowest number of actions of a player.
+
+        *max_actions*: Highest number of actions of a player.
+
+        *batch_size*: Number of matrices per block.
+    """
+    seed: int
+    integer: bool
+    low: Payoff
+    high: Payoff
+    min_actions: int
+    max_actions: int
+    batch_size: int
+
+    def __init__(self, seed: int, integer: bool, low: Payoff, high: Payoff,
+                 min_actions: int = 2, max_actions: int = 5, batch_size: int = 256) -> None:
+        self.seed = seed
+        self.integer = integer
+        self.low = low
+        self.high = high
+        self.min_actions = min_actions
+        self.max_actions = max_actions
+        self.batch_size = batch_size
+        self._block_number = None
+
+    def block(self, block_number: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the numbers of row and col actions, shape (batch_size,), and the payoffs,
+        shape (batch_size, max_actions, max_actions, 2), of the matrices in the given block.
+        Only the top left rows x cols of every matrix of payoffs is used."""
+        if block_number != self._block_number:
+            generator = np.random.default_rng(np.random.SeedSequence([self.seed, block_number]))
+            rows = generator.integers(self.min_actions, self.max_actions, size=self.batch_size, endpoint=True)
+            cols = generator.integers(self.min_actions, self.max_actions, size=self.batch_size, endpoint=True)
+            size = (self.batch_size, self.max_actions, self.max_actions, 2)
+            if self.integer:
+                payoffs = generator.integers(self.low, self.high, size=size, endpoint=True)
+            else:
+                payoffs = generator.uniform(self.low, self.high, size=size)
+            self._block = (rows, cols, payoffs)
+            self._block_number = block_number
+        return self._block
+
+    def matrix(self, k: int) -> np.ndarray:
+        """Return matrix *k* (counting from 0) of the sequence, as an array of shape (rows, cols, 2)."""
+        block_number, i = divmod(k, self.batch_size)
+        rows, cols, payoffs = self.block(block_number)
+        return payoffs[i, :rows[i], :cols[i]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        k = 0
+        while True:
+            yield self.matrix(k)
+            k += 1
+
+
+class FileMatrixSuite(MatrixSuite):
+    """Suite of matrices stored in a matrix file (see *write_matrix_file*), for large libraries of games.
+    The file is memory-mapped, so a matrix is only read when it is used and nothing has to be parsed:
+    its *payoff_array* is a read-only view of the file. Raises once it runs out of matrices, like FixedMatrixSuite.
+
+    Class attributes:
+        *path*: Path of the matrix file.
+
+        *k*: Number of the matrix that is currently active, counting from 1.
+
+        *nr_of_matrices*: Number of matrices in the file.
+    """
+    path: str
+    k: int
+    nr_of_matrices: int
+
+    def __init__(self, path: str, start: int = 1) -> None:
+        """Open the file and load matrix *start*."""
+        self.path = path
+        self.name = "File Matrix Suite (" + os.path.basename(path) + ")"
+        self._open()
+        self.set_matrix(start)
+
+    def _open(self) -> None:
+        self._file = np.memmap(self.path, dtype=np.uint8, mode="r")
+        magic, version, _, nr_of_matrices, index_offset = struct.unpack_from(matrix_file_header, self._file)
+        if magic != matrix_file_magic or version != matrix_file_version:
+            raise Exception(self.path + " is not a matrix file of version " + str(matrix_file_version) + ".")
+        self.nr_of_matrices = nr_of_matrices
+        self._index = np.ndarray((nr_of_matrices,), dtype=matrix_file_index, buffer=self._file, offset=index_offset)
+
+    def __len__(self) -> int:
+        return self.nr_of_matrices
+
+    def __repr__(self) -> str:
+        """Add some extra information to the print of this class."""
+        out = self.name + ": Matrix " + self.k.__repr__() + "\n"
+        out += super().__repr__()  # Add the representation of the superclass ( GameSuite.__repr__() ).
+        return out
+
+    def __getstate__(self) -> dict:
+        """Pickle the path instead of the memory map, the file is opened again when unpickled."""
+        state = {key: value for key, value in self.__dict__.items() if key not in ("_file", "_index")}
+        state["payoff_array"] = np.array(self.payoff_array)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._open()
+
+    def generate_new_payoff_matrix(self) -> None:
+        """Not so much generate as just reading the next matrix from the file."""
+        self.set_matrix(self.k + 1)
+
+    def set_matrix(self, k: int) -> None:
+        """Make matrix *k* (counting from 1) the current one."""
+        if not 1 <= k <= self.nr_of_matrices:
+            raise Exception("Matrix " + str(k) + " is not in " + self.path + ", it holds "
+                            + str(self.nr_of_matrices) + " matrices.")
+        self.k = k
+        self.payoff_array = self.matrix(k - 1)
+        self.row_actions = list(range(self.payoff_array.shape[0]))
+        self.col_actions = list(range(self.payoff_array.shape[1]))
+
+    def matrix(self, i: int) -> np.ndarray:
+        """Return matrix *i* (counting from 0) as a read-only array of shape (rows, cols, 2), without copying it."""
+        offset, rows, cols = self._index[i].tolist()
+        return np.ndarray((rows, cols, 2), dtype="<f8", buffer=self._file, offset=offset)
+
+
+# The matrix file format, all numbers are little-endian:
+#   header: magic, version, reserved, number of matrices, offset of the index (matrix_file_header)
+#   the payoff arrays: float64 of shape (rows, cols, 2) each, packed one after the other
+#   index: offset, rows and cols of every matrix (matrix_file_index)
+matrix_file_magic = b"MALMATS\0"
+matrix_file_version = 1
+matrix_file_header = "<8sIIQQ"
+matrix_file_index = np.dtype([("offset", "<u8"), ("rows", "<u4"), ("cols", "<u4")])
+
+
+def write_matrix_file(path: str, matrices: Iterable[np.ndarray]) -> int:
+    """Write payoff arrays of shape (rows, cols, 2) to a matrix file for FileMatrixSuite
+    and return the number of matrices written. The matrices are written as they come,
+    so only the index is kept in memory. The file is replaced at the end, so readers never see half a file."""
+    index = []
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(bytes(struct.calcsize(matrix_file_header)))
+        for matrix in matrices:
+            matrix = np.ascontiguousarray(matrix, dtype="<f8")
+            if matrix.ndim != 3 or matrix.shape[2] != 2:
+                raise Exception("A payoff array should have shape (rows, cols, 2), not " + str(matrix.shape) + ".")
+            index.append((f.tell(), matrix.shape[0], matrix.shape[1]))
+            f.write(matrix.tobytes())
+        index_offset = f.tell()
+        f.write(np.array(index, dtype=matrix_file_index).tobytes())
+        f.seek(0)
+        f.write(struct.pack(matrix_file_header, matrix_file_magic, matrix_file_version, 0, len(index), index_offset))
+    os.replace(temp_path, path)
+    return len(index)
+
+
+def export_matrix_suite(matrix_suite: MatrixSuite, path: str, nr_of_matrices: int) -> int:
+    """Write the current matrix of a suite and the next *nr_of_matrices* - 1 it generates to a matrix file.
+    The suite is left at the last matrix written."""
+    def matrices() -> Iterator[np.ndarray]:
+        for i in range(nr_of_matrices):
+            if i > 0:
+                matrix_suite.generate_new_payoff_matrix()
+            yield matrix_suite.payoff_array
+
+    return write_matrix_file(path, matrices())
+
+
+class StaticMatrixSuite(MatrixSuite):
+    """A single payoff matrix copied from another suite, it can not generate new ones.
+
+    Class attributes:
+        *k*: Number of the matrix in the suite it was copied from.
+    """
+    k: int
+
+    def __init__(self, matrix_suite: MatrixSuite) -> None:
+        """Copy the current payoff matrix and actions of the given suite."""
+        self.name = matrix_suite.name
+        self.k = getattr(matrix_suite, "k", 0)
+        self.row_actions = list(matrix_suite.row_actions)
+        self.col_actions = list(matrix_suite.col_actions)
+        self.payoff_matrix = [list(row) for row in matrix_suite.payoff_matrix]
+
+    def __repr__(self) -> str:
+        """Add some extra information to the print of this class."""
+        out = self.name + ": Matrix " + self.k.__repr__() + "\n"
+        out += super().__repr__()  # Add the representation of the superclass ( GameSuite.__repr__() ).
+        return out
+
+    def generate_new_payoff_matrix(self) -> None:
+        raise Exception("A StaticMatrixSuite only holds one payoff matrix, it can not generate a new one.")
+
+
+def stack_payoff_matrices(matrix_suites: List[MatrixSuite]) -> np.ndarray:
+    """Stack the current payoff matrices of the given suites into one array of shape (games, R, C, 2),
+    padding the smaller matrices with zeros."""
+    nr_of_rows = max(len(matrix_suite.row_actions) for matrix_suite in matrix_suites)
+    nr_of_cols = max(len(matrix_suite.col_actions) for matrix_suite in matrix_suites)
+    payoffs = np.zeros((len(matrix_suites), nr_of_rows, nr_of_cols, 2))
+    for g, matrix_suite in enumerate(matrix_suites):
+        matrix = matrix_suite.payoff_array
+        payoffs[g, :matrix.shape[0], :matrix.shape[1]] = matrix
+    return payoffs
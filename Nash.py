@@ -10,11 +10,16 @@
 #         Credit for this goes to Pierre Krack.
 #
 # A test for the run_gambit method is included in Main.py
+#
+# The equilibria can also be found in process, without gambit, with support enumeration or Lemke-Howson.
 
+import itertools
 import subprocess
 import os
 import shutil
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
 
 from GrandTable import GrandTable
 from Strategies import Strategy
@@ -22,14 +27,276 @@ from Strategies import Strategy
 from Utils import flatten, transpose
 
 
-def nash_equilibria(strategies: List[Strategy], grand_table: GrandTable) -> None:
-    """Go from the GrandTable to a call to run_gambit.
-    :param grand_table: The calculated Grand Table"""
-    run_gambit(strategies, grand_table.grand_table)
+class Equilibrium:
+    """A Nash equilibrium of the bimatrix game of a grand table, see *bimatrix*.
+
+    Class attributes:
+        *row_strategy*: Probability of every strategy of the table for the row player.
+
+        *col_strategy*: Probability of every strategy of the table for the column player.
+
+        *row_payoff*: Expected score of the row player.
+
+        *col_payoff*: Expected score of the column player.
+    """
+    row_strategy: List[float]
+    col_strategy: List[float]
+    row_payoff: float
+    col_payoff: float
+
+    def __init__(self, row_strategy: np.ndarray, col_strategy: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+        self.row_strategy = row_strategy.tolist()
+        self.col_strategy = col_strategy.tolist()
+        self.row_payoff = float(row_strategy @ a @ col_strategy)
+        self.col_payoff = float(row_strategy @ b @ col_strategy)
+
+    def __repr__(self) -> str:
+        return "Equilibrium(" + str([round(p, 3) for p in self.row_strategy]) + ", " + \
+               str([round(p, 3) for p in self.col_strategy]) + ")"
+
+
+def nash_equilibria(strategies: List[Strategy], grand_table: GrandTable, solver: str = "support",
+                    eliminate: bool = True, mixed_dominance: bool = False) -> List[Equilibrium]:
+    """Find the Nash equilibria of the GrandTable, pretty print and return them.
+    :param grand_table: The calculated Grand Table
+    :param solver: "support" for support enumeration, "lemke-howson" for the equilibria Lemke-Howson
+    finds from every starting label, or "gambit" to call run_gambit.
+    :param eliminate: First remove the strictly dominated strategies (see *eliminate_dominated*) and solve
+    the smaller game. That doesn't change the equilibria, which are mapped back to all strategies.
+    :param mixed_dominance: Also remove strategies that are only strictly dominated by a mixed strategy."""
+    a, b = bimatrix(grand_table.grand_table)
+    rows, cols = list(range(len(a))), list(range(len(a[0])))
+    if eliminate:
+        rows, cols = eliminate_dominated(a, b, mixed_dominance)
+        print("Strictly dominated for the row player:", [strategies[i].name for i in range(len(a)) if i not in rows])
+        print("Strictly dominated for the column player:", [strategies[j].name for j in range(len(a[0])) if j not in cols])
+    reduced_a, reduced_b = a[np.ix_(rows, cols)], b[np.ix_(rows, cols)]
+
+    if solver == "gambit":
+        if rows != cols:
+            raise Exception("gambit can only solve the grand table game with the same strategies for both players.")
+        reduced = gambit_equilibria([strategies[i] for i in rows], reduced_a.tolist())
+    elif solver == "support":
+        reduced = support_enumeration(reduced_a, reduced_b)
+    elif solver == "lemke-howson":
+        reduced = unique_equilibria([lemke_howson(reduced_a, reduced_b, label) for label in range(len(rows) + len(cols))])
+    else:
+        raise Exception("Unknown Nash equilibrium solver: " + solver)
+
+    equilibria = []
+    for equilibrium in reduced:
+        x = np.zeros(len(a))
+        x[rows] = equilibrium.row_strategy
+        y = np.zeros(len(a[0]))
+        y[cols] = equilibrium.col_strategy
+        equilibria.append(Equilibrium(x, y, a, b))
+    print_equilibria(strategies, equilibria)
+    return equilibria
+
+
+def eliminate_dominated(a: np.ndarray, b: np.ndarray, mixed: bool = False,
+                        tolerance: float = 1e-9) -> Tuple[List[int], List[int]]:
+    """Iterated elimination of strictly dominated strategies of the bimatrix game (a, b).
+    A strategy is strictly dominated when another one scores more against every remaining strategy
+    of the opponent, or with *mixed* also when a mixture of the other ones does.
+    Strictly dominated strategies are never played in an equilibrium, so the equilibria stay the same,
+    and the order of the eliminations doesn't matter.
+    :return: The strategies that are left for the row and for the column player."""
+    rows, cols = list(range(a.shape[0])), list(range(a.shape[1]))
+    while True:
+        # The column player's payoffs with its strategies as rows
+        dominated_rows = dominated(a[np.ix_(rows, cols)], mixed, tolerance)
+        dominated_cols = dominated(b[np.ix_(rows, cols)].T, mixed, tolerance)
+        if not dominated_rows and not dominated_cols:
+            return rows, cols
+        rows = [i for k, i in enumerate(rows) if k not in dominated_rows]
+        cols = [j for k, j in enumerate(cols) if k not in dominated_cols]
+
+
+def dominated(payoffs: np.ndarray, mixed: bool, tolerance: float) -> List[int]:
+    """The rows of *payoffs* that are strictly dominated by another row, or with *mixed* by a mixture of rows.
+    Row i is dominated by a mixture when the zero-sum game payoffs[k] - payoffs[i] over the other rows k
+    has a positive value, which Lemke-Howson gives."""
+    result = []
+    for i in range(len(payoffs)):
+        others = np.delete(payoffs, i, axis=0) - payoffs[i]
+        if len(others) == 0:
+            continue
+        if np.any(np.all(others > tolerance, axis=1)):
+            result.append(i)
+        elif mixed:
+            equilibrium = lemke_howson(others, -others)
+            if equilibrium.row_payoff > tolerance:
+                result.append(i)
+    return result
+
+
+def bimatrix(table: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """The payoff matrices of the row and the column player of the game gambit is given by run_gambit:
+    both players pick a strategy of the table and get its score against the other one, so B is A transposed."""
+    a = np.array(table, dtype=float)
+    return a, a.T.copy()
+
+
+def support_enumeration(a: np.ndarray, b: np.ndarray, tolerance: float = 1e-9) -> List[Equilibrium]:
+    """All Nash equilibria with supports of equal size, which are all of them for a nondegenerate game.
+    For every pair of supports I and J the column strategy y on J must make the row player indifferent on I,
+    and the row strategy x on I the column player on J, which are two linear solves,
+    and no strategy outside the supports may do better.
+    All pairs of one size are checked at once, as stacks of small systems.
+    The payoffs are scaled to a spread of 1 first, which doesn't change the equilibria,
+    so *tolerance* means the same for any payoff scale."""
+    m, n = a.shape
+    equilibria = []
+    scaled_a, scaled_b = normalize_payoffs(a), normalize_payoffs(b)
+    for size in range(1, min(m, n) + 1):
+        row_supports = np.array(list(itertools.combinations(range(m), size)))
+        col_supports = np.array(list(itertools.combinations(range(n), size)))
+        rows = np.repeat(row_supports, len(col_supports), axis=0)
+        cols = np.tile(col_supports, (len(row_supports), 1))
+
+        # y on J with A_IJ y = v 1 and sum(y) = 1, x on I with x B_IJ = u 1 and sum(x) = 1
+        y_parts = solve_indifference(scaled_a[rows[:, :, None], cols[:, None, :]], tolerance)
+        x_parts = solve_indifference(scaled_b[rows[:, :, None], cols[:, None, :]].transpose(0, 2, 1), tolerance)
+        candidates = np.all(y_parts > tolerance, axis=1) & np.all(x_parts > tolerance, axis=1)
+
+        x = np.zeros((candidates.sum(), m))
+        np.put_along_axis(x, rows[candidates], x_parts[candidates], axis=1)
+        y = np.zeros((candidates.sum(), n))
+        np.put_along_axis(y, cols[candidates], y_parts[candidates], axis=1)
+        # Best responses: no pure strategy outside the support may score more than the support
+        row_scores = y @ scaled_a.T
+        col_scores = x @ scaled_b
+        row_payoffs = np.sum(x * row_scores, axis=1)
+        col_payoffs = np.sum(y * col_scores, axis=1)
+        best_responses = np.all(row_scores <= row_payoffs[:, None] + tolerance, axis=1) & \
+            np.all(col_scores <= col_payoffs[:, None] + tolerance, axis=1)
+        equilibria.extend(Equilibrium(x_i, y_i, a, b) for x_i, y_i in zip(x[best_responses], y[best_responses]))
+    return equilibria
+
+
+def normalize_payoffs(payoffs: np.ndarray) -> np.ndarray:
+    """Shift and scale the payoffs to the range 0 to 1, a constant matrix is only shifted."""
+    spread = np.ptp(payoffs)
+    return (payoffs - payoffs.min()) / (spread if spread > 0 else 1.0)
+
+
+def solve_indifference(blocks: np.ndarray, tolerance: float) -> np.ndarray:
+    """For a stack of square blocks M, find the strategy that sums to 1 and makes the other player indifferent
+    between the rows of M: M s = c 1, for some payoff c. Stacks whose system is singular get NaN.
+    A system counts as singular when |det| divided by the product of the lengths of its rows is below *tolerance*:
+    that ratio is 1 for orthogonal rows and 0 for dependent ones, whatever the scale of M."""
+    count, size, _ = blocks.shape
+    systems = np.zeros((count, size + 1, size + 1))
+    systems[:, :size, :size] = blocks
+    systems[:, :size, size] = -1.0
+    systems[:, size, :size] = 1.0
+    solutions = np.full((count, size), np.nan)
+    solvable = np.abs(np.linalg.det(systems)) > tolerance * np.prod(np.linalg.norm(systems, axis=2), axis=1)
+    right_side = np.zeros((solvable.sum(), size + 1, 1))
+    right_side[:, size] = 1.0
+    solutions[solvable] = np.linalg.solve(systems[solvable], right_side)[:, :size, 0]
+    return solutions
+
 
+def lemke_howson(a: np.ndarray, b: np.ndarray, label: int = 0) -> Equilibrium:
+    """Find one Nash equilibrium with the Lemke-Howson algorithm, by complementary pivoting from the
+    artificial equilibrium after dropping *label*: 0 to m - 1 are the strategies of the row player
+    and m to m + n - 1 those of the column player.
+    The polytopes are {y >= 0 | A y <= 1} and {x >= 0 | B^T x <= 1}, for payoffs made positive first.
+    Ties in the ratio test are broken lexicographically, so it also ends on a degenerate game."""
+    m, n = a.shape
+    # Shifting the payoffs doesn't change the equilibria
+    positive_a = a - a.min() + 1.0
+    positive_b = b - b.min() + 1.0
+    # Columns: one per label then the right side. Constraints of y: slack r_i (label i), y_j (label m + j)
+    col_tableau = np.hstack([np.eye(m), positive_a, np.ones((m, 1))])
+    col_basis = list(range(m))
+    # Constraints of x: x_i (label i), slack s_j (label m + j)
+    row_tableau = np.hstack([positive_b.T, np.eye(n), np.ones((n, 1))])
+    row_basis = list(range(m, m + n))
 
-def run_gambit(strategies: List[Strategy], table: List[List[float]]) -> None:
-    """Run the gambit enum mixed command line tool and pretty print the result.
+    # The label of the row player's strategies is missing from the x polytope first, and the other way around
+    tableaux = [(row_tableau, row_basis, range(m, m + n)), (col_tableau, col_basis, range(m))]
+    if label >= m:
+        tableaux.reverse()
+    entering = label
+    turn = 0
+    while True:
+        tableau, basis, slacks = tableaux[turn]
+        leaving = pivot(tableau, basis, entering, list(slacks))
+        if leaving == label:
+            break
+        entering = leaving
+        turn = 1 - turn
+
+    x = np.zeros(m)
+    for row, variable in enumerate(row_basis):
+        if variable < m:
+            x[variable] = row_tableau[row, -1]
+    y = np.zeros(n)
+    for row, variable in enumerate(col_basis):
+        if variable >= m:
+            y[variable - m] = col_tableau[row, -1]
+    return Equilibrium(x / x.sum(), y / y.sum(), a, b)
+
+
+def pivot(tableau: np.ndarray, basis: List[int], entering: int, slacks: List[int]) -> int:
+    """Let the variable *entering* into the basis, with the lexicographic minimum ratio test, and return
+    the variable that leaves it. *slacks* are the columns of the initial basis, used to break ties."""
+    column = tableau[:, entering]
+    candidates = [row for row in range(len(tableau)) if column[row] > 1e-12]
+    # Compare the rows of [right side, inverse of the basis] divided by the column, lexicographically
+    keys = tableau[:, [-1] + slacks] / np.where(column > 1e-12, column, 1.0)[:, None]
+    pivot_row = min(candidates, key=lambda row: tuple(np.round(keys[row], 12)))
+
+    tableau[pivot_row] /= tableau[pivot_row, entering]
+    for row in range(len(tableau)):
+        if row != pivot_row:
+            tableau[row] -= tableau[row, entering] * tableau[pivot_row]
+    leaving = basis[pivot_row]
+    basis[pivot_row] = entering
+    return leaving
+
+
+def unique_equilibria(equilibria: List[Equilibrium], decimals: int = 6) -> List[Equilibrium]:
+    """Drop the equilibria that equal an earlier one up to rounding."""
+    seen = set()
+    unique = []
+    for equilibrium in equilibria:
+        key = tuple(np.round(equilibrium.row_strategy + equilibrium.col_strategy, decimals) + 0.0)
+        if key not in seen:
+            seen.add(key)
+            unique.append(equilibrium)
+    return unique
+
+
+def print_equilibria(strategies: List[Strategy], equilibria: List[Equilibrium]) -> None:
+    """Pretty print the equilibria like run_gambit, with the probabilities of the row and the column player."""
+    padding = max(map(lambda s: len(s.name), strategies)) + 1
+    name_format = '{:>' + padding.__repr__() + '}'
+    num_format = '{:^6}'
+    linesize = padding + 14
+    hline = ("=" * linesize) + "|"
+
+    for equilibrium in equilibria:
+        print(hline)
+        for strategy, x, y in zip(strategies, equilibrium.row_strategy, equilibrium.col_strategy):
+            x, y = ('{:.2f}'.format(p).replace('0.00', '----') for p in (abs(x), abs(y)))
+            print(name_format.format(strategy.name) + ":" + num_format.format(x) + "|" + num_format.format(y) + "|")
+    print(hline)
+
+
+def run_gambit(strategies: List[Strategy], table: List[List[float]]) -> List[Equilibrium]:
+    """Run the gambit enum mixed command line tool, pretty print and return the result.
+    See *gambit_equilibria*."""
+    equilibria = gambit_equilibria(strategies, table)
+    print_equilibria(strategies, equilibria)
+    return equilibria
+
+
+def gambit_equilibria(strategies: List[Strategy], table: List[List[float]]) -> List[Equilibrium]:
+    """Run the gambit enum mixed command line tool and return the result.
     :param strategies: List of the strategies used to create the table.
     :param table: Grand Table scores as a 2D matrix.
 
@@ -93,13 +360,6 @@ def run_gambit(strategies: List[Strategy], table: List[List[float]]) -> None:
           Also in the output format 0.00 is replaced with ----
     """
 
-    # Determine padding for pretty printing output.
-    padding = max(map(lambda s: len(s.name), strategies)) + 1
-    name_format = '{:>' + padding.__repr__() + '}'
-    num_format = '{:^6}'
-    linesize = padding + 14
-    hline = ("=" * linesize) + "|"
-
     # Make a call to gambit
     nr_of_strats = len(strategies)
     gambit_input = 'NFG 1 R "" { "1" "2" } { ' + \
@@ -115,18 +375,13 @@ def run_gambit(strategies: List[Strategy], table: List[List[float]]) -> None:
     else:
         raise Exception("gambit-enummixed executable not found.")
 
-    for line in result.splitlines():
-        line = line.__repr__()
-        line = line.strip("'")
-        line = line.replace('0.00', '----')
-        values = line.split(sep=",")
-        print(hline)
-        for i, strategy in enumerate(strategies):
-            name = name_format.format(strategy.name)
-            x = num_format.format(values[i + 1])
-            y = num_format.format(values[i + 1 + nr_of_strats])
-            print(name + ":" + x + "|" + y + "|")
-    print(hline)
+    a, b = bimatrix(table)
+    equilibria = []
+    for line in result.decode().splitlines() if isinstance(result, bytes) else result.splitlines():
+        # NE,x_1,...,x_n,y_1,...,y_n where Windows writes 0.00 as ----
+        values = [0.0 if value.strip() == '----' else float(value) for value in line.split(sep=",")[1:]]
+        equilibria.append(Equilibrium(np.array(values[:nr_of_strats]), np.array(values[nr_of_strats:]), a, b))
+    return equilibria
 
 
 def execute_command(command: str) -> str:
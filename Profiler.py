@@ -0,0 +1,78 @@
+# NOTE: Instrumentation of the hot path of Game.play.
+# Give a Profiler to a Game or GrandTable to add up the time and calls of every strategy method,
+# and of the payoff lookup and bookkeeping of the games themselves.
+# Game.play only reads the clock when it has a profiler, so turning it off costs a few checks per round.
+
+import json
+from typing import Dict, List, Tuple
+
+# The method of Game that makes the recorded calls, for the stacks of to_folded, Game.play unless listed here
+callers = {"initialize": "Game.initialize"}
+
+
+class Profiler:
+    """Add up the time spent and the number of calls per (strategy class, method),
+    plus the time of the payoff lookup and bookkeeping in Game.play (recorded under class "Game").
+
+    Class attributes:
+        *records*: Dictionary from (class name, method name) to a list of [calls, seconds].
+    """
+    records: Dict[Tuple[str, str], List[float]]
+
+    def __init__(self) -> None:
+        self.records = {}
+
+    def add(self, class_name: str, method: str, seconds: float) -> None:
+        """Record one call that took the given number of seconds."""
+        record = self.records.get((class_name, method))
+        if record is None:
+            self.records[class_name, method] = [1, seconds]
+        else:
+            record[0] += 1
+            record[1] += seconds
+
+    def merge(self, other: "Profiler") -> None:
+        """Add the records of another profiler, i.e. one that ran in another process."""
+        for key, (calls, seconds) in other.records.items():
+            record = self.records.setdefault(key, [0, 0.0])
+            record[0] += calls
+            record[1] += seconds
+
+    def total_seconds(self) -> float:
+        """Total time of everything that was recorded."""
+        return sum(seconds for _, seconds in self.records.values())
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """The records as a dictionary from "Class.method" to its calls, seconds and mean microseconds per call,
+        sorted from the most to the least total time."""
+        out = {}
+        for (class_name, method), (calls, seconds) in sorted(self.records.items(), key=lambda item: -item[1][1]):
+            out[class_name + "." + method] = {
+                "calls": calls,
+                "seconds": seconds,
+                "mean_us": seconds / calls * 1e6,
+            }
+        return out
+
+    def to_json(self, path: str) -> None:
+        """Write the records to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_folded(self, path: str) -> None:
+        """Write the records in the folded stack format of flamegraph.pl and speedscope,
+        one "Caller;Class;method microseconds" line per record, where the caller is the method of Game
+        that made the calls (see *callers*)."""
+        with open(path, "w") as f:
+            for (class_name, method), (_, seconds) in sorted(self.records.items()):
+                caller = callers.get(method, "Game.play")
+                f.write(caller + ";" + class_name + ";" + method + " " + str(int(round(seconds * 1e6))) + "\n")
+
+    def __repr__(self) -> str:
+        """Table of the records, with the most expensive ones first."""
+        total = self.total_seconds() or 1.0
+        out = '{:<40}{:>12}{:>12}{:>12}{:>8}\n'.format("method", "calls", "seconds", "us/call", "%")
+        for name, record in self.to_dict().items():
+            out += '{:<40}{:>12}{:>12.3f}{:>12.2f}{:>8.1f}\n'.format(
+                name, record["calls"], record["seconds"], record["mean_us"], 100 * record["seconds"] / total)
+        return out
@@ -1,9 +1,11 @@
 # NOTE: Execute the replicator dynamic on the grand table also visualize it as a graph.
 # You may change everything in this file.
 
-from typing import List
+import itertools
+import os
+import struct
+from typing import List, Optional, Sequence, Tuple
 import numpy as np
-import matplotlib.pyplot as plt
 
 from GrandTable import GrandTable
 
@@ -16,39 +18,474 @@ non_uniform_without_own_strat = [0.22, 0.19, 0.04, 0.06, 0.13, 0.10, 0.05, 0.21]
 
 
 class ReplicatorDynamic:
-    def __init__(self, start_proportions: List[float], grand_table: GrandTable):
+    def __init__(self, start_proportions: List[float], grand_table: GrandTable, keep_history: bool = True,
+                 trajectory: Optional["TrajectoryWriter"] = None):
+        """
+        :param keep_history: Keep every step in *history* (and *times*), turn it off for long evolutions.
+        :param trajectory: Also stream the steps to this trajectory file, which the caller closes.
+        """
         self.old_proportions = start_proportions
         self.grand_table = grand_table
-        self.step = 0
+        self.steps = 0
+        self.keep_history = keep_history
+        self.trajectory = trajectory
         self.history = []
-        self.history.append(self.old_proportions)
+        self.times = []
+        self.record(0.0, self.old_proportions)
+
+    def record(self, time: float, proportions: List[float]):
+        """Add the proportions at the given time (the step for *evolve*) to the history and the trajectory file."""
+        if self.keep_history:
+            self.history.append(proportions)
+            self.times.append(time)
+        if self.trajectory is not None:
+            self.trajectory.write(time, proportions)
 
     def step(self):
-        temp_score = np.matmul(self.grand_table.grand_table, self.old_proportions)
-        updated_score = np.multiply(self.old_proportions, temp_score)
-        sum_of_score = sum(updated_score)
-        self.new_proportions = [x / sum_of_score for x in updated_score]
+        table = np.array(self.grand_table.grand_table, dtype=float)
+        self.new_proportions = replicator_step(np.array([self.old_proportions], dtype=float), table)[0].tolist()
 
         # Update the history
-        self.history.append(self.new_proportions)
+        self.record(self.steps, self.new_proportions)
 
     def evolve(self):
         while True:
-            self.step += 1
-            ReplicatorDynamic.step(self)
+            self.steps += 1
+            self.step()
             # Euclidean distance between two proportions
-            self.distance = np.sqrt(sum(list(map(lambda x, y: (x - y)**2, self.old_proportions, self.new_proportions))))
+            self.distance = float(distances(np.array([self.old_proportions]), np.array([self.new_proportions]))[0])
 
             if self.distance  < 0.001: # Less than a very small value 0.001
                 break
             else:
                 self.old_proportions = self.new_proportions
 
-    def to_graph(self):
-        """Visualize the evolution of proportions."""
-        plt.plot(list(range(len(self.history))), self.history)
-        plt.gca().legend(('Random', 'E-Greedy', 'UCB', 'Satisficing Play', 'Bully', 'Fictitious Play', 'Regret Matching', 'Softmax', 'Mutual Benefit'), loc='upper left')
-        plt.xlabel('Step')
-        plt.ylabel('Proportion')
-        plt.title('Replicator dynamics')
+    def evolve_continuous(self, tolerance: float = 0.001, max_steps: int = 10000,
+                          rtol: float = 1e-3, atol: float = 1e-6):
+        """Follow the continuous-time replicator dynamic dx_i/dt = x_i (f_i - x.f), with f the scores of the
+        grand table against the population, using the adaptive Dormand-Prince 5(4) method.
+        It has the same rest points as *evolve*, but follows another path to them.
+
+        The dynamic is integrated in log-proportions, where it is d(log x_i)/dt = f_i - x.f:
+        a dying strategy then goes down a straight line instead of an ever slower exponential decay,
+        so the steps can grow large near a rest point and far fewer products with the grand table are needed.
+        The proportions stay on the simplex by construction.
+
+        The accepted steps are recorded like the steps of *evolve*, with their times instead of step numbers.
+        :param tolerance: Stop once a step of *evolve* from the current proportions would move less than this,
+        which is the Euclidean norm of dx/dt divided by the mean score of the population.
+        :param max_steps: Stop after this many accepted steps.
+        :param rtol: Relative error of the proportions allowed per step.
+        :param atol: Absolute error of the proportions allowed per step.
+        """
+        table = np.array(self.grand_table.grand_table, dtype=float)
+        # A strategy that is extinct stays extinct, at log-proportion -inf
+        with np.errstate(divide="ignore"):
+            log_proportions = np.log(np.array(self.old_proportions, dtype=float))
+        growth, proportions = replicator_growth(log_proportions, table)
+        self.evaluations = 1
+        self.new_proportions = self.old_proportions
+        t = 0.0
+        # The replicator dynamic moves with speed of the order of the payoff differences
+        h = 0.1 / max(1.0, float(np.ptp(table)))
+
+        while self.steps < max_steps and speed(proportions, growth, table) >= tolerance:
+            new_log_proportions, new_growth, new_proportions, error = \
+                dormand_prince_step(log_proportions, growth, h, table)
+            self.evaluations += 6
+            # An error in a log-proportion is a relative error of that proportion
+            largest = np.maximum(proportions, new_proportions)
+            error_norm = float(np.sqrt(np.mean((largest * error / (atol + rtol * largest)) ** 2)))
+
+            if error_norm <= 1.0:
+                t += h
+                self.steps += 1
+                log_proportions, growth, proportions = new_log_proportions, new_growth, new_proportions
+                self.old_proportions = self.new_proportions
+                self.new_proportions = proportions.tolist()
+                self.record(t, self.new_proportions)
+
+            # Standard step size control for a method of order 5
+            factor = 5.0 if error_norm == 0.0 else min(5.0, max(0.2, 0.9 * error_norm ** -0.2))
+            h *= factor
+
+        self.distance = speed(proportions, growth, table)
+
+    def to_graph(self, output: Optional[str] = None):
+        """Visualize the evolution of proportions, labeled with the names of the strategies of the grand table.
+        :param output: Save the graph to this PNG or SVG file without opening a window, instead of showing it.
+        """
+        plot_trajectory(self.times, self.history, strategy_names(self.grand_table), output)
+
+
+class BatchedReplicatorDynamic:
+    """Evolve the replicator dynamic from many starting proportions at once, one vectorized step for all of them.
+    Every row stops on its own once it moves less than *threshold* in a step, like ReplicatorDynamic.evolve,
+    and ends with the same proportions after the same number of steps as a single run from that row.
+    No history is kept, so the memory use only depends on the number of rows.
+
+    Class attributes:
+        *grand_table*: The GrandTable whose scores drive the dynamic.
+
+        *proportions*: Array of shape (P, N), the current proportions of every row.
+
+        *steps*: Array of shape (P,), the number of steps every row took.
+
+        *converged*: Boolean array of shape (P,), True for the rows that stopped moving.
+
+        *threshold*: Euclidean distance of a step below which a row has converged.
+
+        *max_steps*: Maximum number of steps of a row, or None to go on until every row converged.
+    """
+    grand_table: GrandTable
+    proportions: np.ndarray
+    steps: np.ndarray
+    converged: np.ndarray
+    threshold: float
+    max_steps: Optional[int]
+
+    def __init__(self, start_proportions: Sequence[Sequence[float]], grand_table: GrandTable,
+                 threshold: float = 0.001, max_steps: Optional[int] = None):
+        self.grand_table = grand_table
+        self.proportions = np.array(start_proportions, dtype=float)
+        self.steps = np.zeros(len(self.proportions), dtype=int)
+        self.converged = np.zeros(len(self.proportions), dtype=bool)
+        self.threshold = threshold
+        self.max_steps = max_steps
+
+    def evolve(self):
+        """Step all rows that haven't converged yet, until every row converged or took *max_steps* steps."""
+        table = np.array(self.grand_table.grand_table, dtype=float)
+        evolve_rows(self.proportions, self.steps, self.converged, table, self.threshold, self.max_steps)
+
+
+def evolve_rows(proportions: np.ndarray, steps: np.ndarray, converged: np.ndarray, table: np.ndarray,
+                threshold: float, max_steps: Optional[int]):
+    """The loop of BatchedReplicatorDynamic.evolve on bare arrays, which are updated in place."""
+    active = np.flatnonzero(~converged)
+    if max_steps is not None:
+        active = active[steps[active] < max_steps]
+    while len(active) > 0:
+        old_proportions = proportions[active]
+        new_proportions = replicator_step(old_proportions, table)
+        proportions[active] = new_proportions
+        steps[active] += 1
+
+        converged[active] = distances(old_proportions, new_proportions) < threshold
+        active = active[~converged[active]]
+        if max_steps is not None:
+            active = active[steps[active] < max_steps]
+
+
+class RestPoint:
+    """A rest point of the replicator dynamic, see *rest_points*.
+
+    Class attributes:
+        *proportions*: The proportions of all strategies at the rest point.
+
+        *support*: Indices of the strategies with a positive proportion.
+
+        *mean_score*: Score of every strategy in the support against the population, x.f.
+
+        *eigenvalues*: Eigenvalues of the Jacobian of the continuous-time dynamic, restricted to the simplex.
+        The discrete dynamic of *evolve* has the same rest points, its Jacobian is I + J / *mean_score*,
+        so its eigenvalues are 1 + *eigenvalues* / *mean_score*.
+
+        *stability*: "stable" when every eigenvalue has a negative real part, "unstable" when all are positive,
+        "saddle" when there are both and "non-hyperbolic" when a real part is zero.
+
+        *nash*: Whether no strategy outside the support scores higher than *mean_score*,
+        then the rest point is a symmetric Nash equilibrium of the grand table.
+    """
+    proportions: List[float]
+    support: Tuple[int, ...]
+    mean_score: float
+    eigenvalues: np.ndarray
+    stability: str
+    nash: bool
+
+    def __init__(self, proportions: np.ndarray, support: Tuple[int, ...], table: np.ndarray, tolerance: float):
+        self.proportions = proportions.tolist()
+        self.support = support
+        scores = table @ proportions
+        self.mean_score = float(proportions @ scores)
+        self.eigenvalues = np.linalg.eigvals(simplex_jacobian(proportions, table))
+        self.nash = bool(np.all(scores <= self.mean_score + tolerance))
+
+        real_parts = self.eigenvalues.real
+        if np.any(np.abs(real_parts) <= tolerance):
+            self.stability = "non-hyperbolic"
+        elif np.all(real_parts < 0):
+            self.stability = "stable"
+        elif np.all(real_parts > 0):
+            self.stability = "unstable"
+        else:
+            self.stability = "saddle"
+
+    def __repr__(self) -> str:
+        return "RestPoint(" + str([round(p, 3) for p in self.proportions]) + ", " + self.stability + ")"
+
+
+def rest_points(grand_table: GrandTable, tolerance: float = 1e-9) -> List[RestPoint]:
+    """Find the rest points of the replicator dynamic without simulating it.
+    Every face of the simplex, a support S, holds at most one isolated rest point:
+    the proportions on S that give every strategy of S the same score, found with one linear solve.
+    That takes 2^N - 1 small solves for N strategies, instead of a simulation for every starting point.
+    A face whose system is singular holds no rest point or a continuum of them, and is skipped.
+    :param tolerance: Proportions and eigenvalues whose absolute value is below this count as zero.
+    :return: The rest points, ordered by the size of their support.
+    """
+    table = np.array(grand_table.grand_table, dtype=float)
+    n = len(table)
+    points = []
+    for size in range(1, n + 1):
+        for support in itertools.combinations(range(n), size):
+            proportions = face_rest_point(table, support)
+            if proportions is not None and np.all(proportions[list(support)] > tolerance):
+                points.append(RestPoint(proportions, support, table, tolerance))
+    return points
+
+
+def face_rest_point(table: np.ndarray, support: Tuple[int, ...]) -> Optional[np.ndarray]:
+    """Solve A_SS x_S = c 1 and sum(x_S) = 1 for the proportions x_S and the score c.
+    Return the proportions of all strategies, zero outside *support*, or None if the system is singular.
+    The proportions can still be negative, then the rest point lies outside the simplex."""
+    size = len(support)
+    system = np.zeros((size + 1, size + 1))
+    system[:size, :size] = table[np.ix_(support, support)]
+    system[:size, size] = -1.0
+    system[size, :size] = 1.0
+    right_side = np.zeros(size + 1)
+    right_side[size] = 1.0
+    try:
+        solution = np.linalg.solve(system, right_side)
+    except np.linalg.LinAlgError:
+        return None
+    proportions = np.zeros(len(table))
+    proportions[list(support)] = solution[:size]
+    return proportions
+
+
+def simplex_jacobian(proportions: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """Jacobian of dx_i/dt = x_i (f_i - x.f) at *proportions*, in an orthonormal basis of the plane of the simplex.
+    The full N x N Jacobian maps that plane into itself, its remaining eigenvalue -x.f only
+    describes leaving the plane, which the dynamic never does."""
+    n = len(table)
+    scores = table @ proportions
+    mean_score = proportions @ scores
+    jacobian = np.diag(scores - mean_score) + \
+        proportions[:, None] * (table - (scores + table.T @ proportions)[None, :])
+    # Orthonormal basis of the vectors that sum to zero
+    basis = np.linalg.qr(np.eye(n)[:, :n - 1] - np.eye(n)[:, n - 1:])[0]
+    return basis.T @ jacobian @ basis
+
+
+def replicator_step(proportions: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """One step of the discrete replicator dynamic for every row of *proportions*, shape (P, N):
+    every proportion is multiplied by its score against the population and normalized.
+    The sums are done column by column in a fixed order instead of by a matrix product,
+    whose summation order can depend on the shape of the batch, so a row gets the same numbers in any batch."""
+    scores = proportions[:, :1] * table[:, 0]
+    for j in range(1, table.shape[1]):
+        scores = scores + proportions[:, j:j + 1] * table[:, j]
+    updated_scores = proportions * scores
+    return updated_scores / row_sums(updated_scores)[:, None]
+
+
+def replicator_growth(log_proportions: np.ndarray, table: np.ndarray):
+    """Growth rate f_i - x.f of every log-proportion in the continuous-time replicator dynamic, shape (N,).
+    Return it with the proportions x."""
+    proportions = np.exp(log_proportions - np.max(log_proportions))
+    proportions /= proportions.sum()
+    scores = table @ proportions
+    return scores - proportions @ scores, proportions
+
+
+# Butcher tableau of the Dormand-Prince 5(4) method, the dynamic doesn't depend on time so the nodes aren't needed
+dp_a = [[],
+        [1 / 5],
+        [3 / 40, 9 / 40],
+        [44 / 45, -56 / 15, 32 / 9],
+        [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+        [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656]]
+dp_b = [35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]
+# Difference between the weights of the 5th and the embedded 4th order solution
+dp_e = [71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]
+
+
+def speed(proportions: np.ndarray, growth: np.ndarray, table: np.ndarray) -> float:
+    """Euclidean distance a step of the discrete dynamic would move: dx/dt divided by the mean score."""
+    return float(np.sqrt(np.sum((proportions * growth) ** 2)) / (proportions @ (table @ proportions)))
+
+
+def dormand_prince_step(log_proportions: np.ndarray, growth: np.ndarray, h: float, table: np.ndarray):
+    """Take one Dormand-Prince step of size *h* from *log_proportions*, where the growth rates are *growth*.
+    Return the new log-proportions, the growth rates there (the first stage of the next step),
+    the new proportions and the estimated error of the log-proportions."""
+    stages = [growth]
+    for a in dp_a[1:]:
+        stages.append(replicator_growth(log_proportions + h * sum(a_j * k for a_j, k in zip(a, stages)), table)[0])
+    new_log_proportions = log_proportions + h * sum(b_j * k for b_j, k in zip(dp_b, stages))
+    new_growth, new_proportions = replicator_growth(new_log_proportions, table)
+    stages.append(new_growth)
+    error = h * sum(e_j * k for e_j, k in zip(dp_e, stages))
+    return new_log_proportions, new_growth, new_proportions, error
+
+
+# Trajectory file layout, all little endian:
+#   header: magic, version, number of strategies, number of rows (trajectory_file_header)
+#   the rows: float32 time (or step) followed by the proportions, packed one after the other
+trajectory_file_magic = b"MALTRAJ\0"
+trajectory_file_version = 1
+trajectory_file_header = "<8sIIQ"
+
+
+class TrajectoryWriter:
+    """Stream the proportions of an evolution to a trajectory file (see *read_trajectory*), so nothing but
+    the file has to grow with the length of the evolution. Every *every*-th row is written,
+    the last row is always written when the writer is closed. The file is replaced when it is closed,
+    so readers never see half a file. Used in a with statement, an exception discards the file instead.
+
+    Class attributes:
+        *path*: The trajectory file.
+
+        *nr_of_strategies*: Number of proportions in a row.
+
+        *every*: Only every so many rows are written, 1 writes all of them.
+
+        *rows*: Number of rows given to *write* so far.
+
+        *rows_written*: Number of rows in the file so far.
+    """
+    path: str
+    nr_of_strategies: int
+    every: int
+    rows: int
+    rows_written: int
+
+    def __init__(self, path: str, nr_of_strategies: int, every: int = 1) -> None:
+        if every < 1:
+            raise Exception("A trajectory can't be written every " + str(every) + " rows.")
+        self.path = path
+        self.nr_of_strategies = nr_of_strategies
+        self.every = every
+        self.rows = 0
+        self.rows_written = 0
+        self._last_row = None
+        self._temp_path = path + ".tmp"
+        self._file = open(self._temp_path, "wb")
+        self._file.write(bytes(struct.calcsize(trajectory_file_header)))
+
+    def write(self, time: float, proportions: Sequence[float]) -> None:
+        """Add a row to the trajectory, it goes into the file if it is one of every *every* rows."""
+        if len(proportions) != self.nr_of_strategies:
+            raise Exception("Expected " + str(self.nr_of_strategies) + " proportions, not " + str(len(proportions)) + ".")
+        row = np.empty(self.nr_of_strategies + 1, dtype="<f4")
+        row[0] = time
+        row[1:] = proportions
+        if self.rows % self.every == 0:
+            self._file.write(row.tobytes())
+            self.rows_written += 1
+            self._last_row = None
+        else:
+            self._last_row = row
+        self.rows += 1
+
+    def close(self) -> None:
+        """Write the last row if it was skipped, finish the header and put the file in place."""
+        if self._file.closed:
+            return
+        if self._last_row is not None:
+            self._file.write(self._last_row.tobytes())
+            self.rows_written += 1
+            self._last_row = None
+        self._file.seek(0)
+        self._file.write(struct.pack(trajectory_file_header, trajectory_file_magic, trajectory_file_version,
+                                     self.nr_of_strategies, self.rows_written))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def discard(self) -> None:
+        """Remove the unfinished file and keep what was at *path* before."""
+        if self._file.closed:
+            return
+        self._file.close()
+        os.remove(self._temp_path)
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def read_trajectory(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Memory-map a trajectory file written by TrajectoryWriter.
+    :return: The times (or steps) of the rows, shape (rows,), and the proportions, shape (rows, strategies)."""
+    with open(path, "rb") as f:
+        magic, version, nr_of_strategies, nr_of_rows = struct.unpack(trajectory_file_header,
+                                                                     f.read(struct.calcsize(trajectory_file_header)))
+    if magic != trajectory_file_magic or version != trajectory_file_version:
+        raise Exception(path + " is not a trajectory file of version " + str(trajectory_file_version) + ".")
+    if nr_of_rows == 0:
+        return np.zeros(0, dtype="<f4"), np.zeros((0, nr_of_strategies), dtype="<f4")
+    rows = np.memmap(path, dtype="<f4", mode="r", offset=struct.calcsize(trajectory_file_header),
+                     shape=(nr_of_rows, nr_of_strategies + 1))
+    return rows[:, 0], rows[:, 1:]
+
+
+def strategy_names(grand_table: GrandTable) -> List[str]:
+    """Names of the strategies of the grand table, in the order of its rows."""
+    return [strategy.name for strategy in grand_table.row_strategies]
+
+
+def plot_trajectory(times: Sequence[float], proportions: Sequence[Sequence[float]], labels: Sequence[str],
+                    output: Optional[str] = None):
+    """Plot the proportions against the times (or steps), with one labeled line per strategy.
+    :param output: Render the graph off-screen to this file, its extension (.png or .svg) picks the format.
+    None shows it in a window instead.
+    Matplotlib is only imported here, so evolving and writing trajectories doesn't need it.
+    """
+    if output is None:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
+    else:
+        # A figure without pyplot never touches the GUI backend
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        figure = Figure()
+        FigureCanvasAgg(figure)
+
+    axes = figure.add_subplot()
+    axes.plot(times, proportions)
+    axes.legend(labels, loc='upper left')
+    axes.set_xlabel('Step')
+    axes.set_ylabel('Proportion')
+    axes.set_title('Replicator dynamics')
+
+    if output is None:
         plt.show()
+    else:
+        figure.savefig(output)
+
+
+def plot_trajectory_file(path: str, labels: Sequence[str], output: Optional[str] = None):
+    """Plot a trajectory file, see *plot_trajectory*."""
+    times, proportions = read_trajectory(path)
+    plot_trajectory(times, proportions, labels, output)
+
+
+def distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Euclidean distance between every row of *a* and the same row of *b*."""
+    return np.sqrt(row_sums((a - b) ** 2))
+
+
+def row_sums(values: np.ndarray) -> np.ndarray:
+    """Sum every row from left to right."""
+    total = values[:, 0].copy()
+    for j in range(1, values.shape[1]):
+        total = total + values[:, j]
+    return total
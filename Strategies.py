@@ -7,20 +7,27 @@ import abc
 import random
 import numpy as np
 import math
-from typing import List
+from typing import Any, List, Optional, Sequence
 
 import MatrixSuite
 from MatrixSuite import Action, Payoff
 import Utils
 
+# Safety margin for *is_locked* checks on running averages, so floating point rounding can't create a tie later.
+LOCK_MARGIN = 1e-9
+
 
 class Strategy(metaclass=abc.ABCMeta):
     """Abstract representation of a what a Strategy should minimally implement.
 
     Class attributes:
         name: A string representing the name of the strategy.
+
+        _random_stream: The strategy's own RandomStream, or None to use the global random module.
+        It is set with set_random_stream and kept private, so it stays out of the fingerprint.
     """
     name: str
+    _random_stream: Optional[Utils.RandomStream] = None
 
     def __repr__(self) -> str:
         """The string representation of a strategy is just it's name.
@@ -55,6 +62,27 @@ class Strategy(metaclass=abc.ABCMeta):
         """
         pass
 
+    def set_random_stream(self, random_stream: Optional[Utils.RandomStream]) -> None:
+        """Give the strategy its own stream of random numbers, or None to go back to the global random module."""
+        self._random_stream = random_stream
+
+    def random_choice(self, seq: Sequence[Any]) -> Any:
+        """Pick a random item from a non-empty sequence, like random.choice,
+        but from the strategy's own random stream if it has one. Strategies should use this for all random choices."""
+        if self._random_stream is None:
+            return random.choice(seq)
+        return self._random_stream.choice(seq)
+
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Return True if the strategy will deterministically keep playing *action* in every future round,
+        as long as the opponent keeps playing *opp_action*. This lets a Game fast-forward settled pairings.
+        The default of False is always safe. Any strategy can override it to return True when its state proves
+        it is locked, like FictitiousPlay, Softmax and MutualBenefit do, it doesn't have to be *deterministic*.
+        :param action: The action this strategy played last round.
+        :param opp_action: The action the opposing strategy played last round.
+        """
+        return False
+
 
 # As an example we have implemented the first strategy for you.
 
@@ -84,7 +112,7 @@ class Aselect(Strategy):
 
     def get_action(self, round_: int) -> Action:
         """Pick the next action randomly from the possible actions."""
-        return random.choice(self.actions)
+        return self.random_choice(self.actions)
 
     def update(self, round_: int, action: Action, payoff: Payoff, opp_action: Action, opp_payoff: Payoff) -> None:
         """Aselect has no update mechanic."""
@@ -114,7 +142,7 @@ class EpsilonGreedy(Strategy):
     def get_action(self, round_: int) -> Action:
         """Pick the next action."""
         if self.round_ == 0:
-            action = random.choice(self.actions)
+            action = self.random_choice(self.actions)
         else:
             # Calculate the action value for each action
             self.action_value_list = list(map(lambda x, y: x/y, self.action_payoff_list, self.action_num_list))
@@ -122,7 +150,7 @@ class EpsilonGreedy(Strategy):
             optimal_actions = [i for i, value in enumerate(self.action_value_list) if value == max(self.action_value_list)]
 
             # The random action resulting from the epsilon-probability of exploration
-            random_action = random.choice(self.actions)
+            random_action = self.random_choice(self.actions)
 
             # The final possible actions -> actions with larger probability are multiplied proportionally
             optimal_actions_str = list(map(str, optimal_actions))
@@ -131,7 +159,7 @@ class EpsilonGreedy(Strategy):
             actions = list(map(int, actions_str))
 
             # Pick the next action randomly from the possible actions with equal probability
-            action = random.choice(actions)
+            action = self.random_choice(actions)
 
         return action
 
@@ -162,7 +190,7 @@ class UCB(Strategy):
     def get_action(self, round_: int) -> Action:
         """Pick the next action."""
         if self.round_ == 0:
-            action = random.choice(self.actions)
+            action = self.random_choice(self.actions)
         else:
             # Calculate the action value for each action
             self.action_value_list = list(map(lambda x, y: x / y, self.action_payoff_list, self.action_num_list))
@@ -175,7 +203,7 @@ class UCB(Strategy):
                                value == max(self.adjusted_action_value_list)]
 
             # Pick the next action randomly from the possible optimal actions with equal probability
-            action = random.choice(optimal_actions)
+            action = self.random_choice(optimal_actions)
 
         return action
 
@@ -209,12 +237,12 @@ class SatisficingPlay(Strategy):
     def get_action(self, round_: int) -> Action:
         """Pick the next action."""
         if self.round_ == 0:
-            action = random.choice(self.actions)
+            action = self.random_choice(self.actions)
         else:
             if self.previous_payoff >= self.previous_aspiration_level:
                 action = self.previous_action
             else:
-                action = random.choice(self.actions)
+                action = self.random_choice(self.actions)
 
         return action
 
@@ -226,6 +254,13 @@ class SatisficingPlay(Strategy):
         # Update the aspiration level
         self.previous_aspiration_level = self.persistence_rate * self.previous_aspiration_level + (1 - self.persistence_rate) * self.previous_payoff
 
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Locked once it is satisfied and the aspiration level no longer changes,
+        as against the same opponent action it then keeps getting the same payoff."""
+        return (self.round_ > 0 and action == self.previous_action
+                and self.previous_payoff >= self.previous_aspiration_level
+                and self.persistence_rate * self.previous_aspiration_level + (1 - self.persistence_rate) * self.previous_payoff == self.previous_aspiration_level)
+
 
 class Bully(Strategy):
     """Implements the Bully algorithm."""
@@ -239,19 +274,10 @@ class Bully(Strategy):
         self.actions = matrix_suite.get_actions(player)
 
         self.round_ = 0
+        self._player_payoffs = matrix_suite.player_payoffs(player)
+        self.payoff_matrix = self._player_payoffs.matrix
         # Get the action with a highest security value from the payoff matrix
-        actions_by_security_values = []
-        if player == "row":
-            self.payoff_matrix = matrix_suite.payoff_matrix
-            for row in self.payoff_matrix:
-                security_value = min([x for (x, y) in row if y == max(row, key=lambda x: x[1])[1]])
-                actions_by_security_values.append(security_value)
-        if player == "col":
-            self.payoff_matrix = Utils.transpose(matrix_suite.payoff_matrix)
-            for row in self.payoff_matrix:
-                security_value = min([y for (x, y) in row if x == max(row, key=lambda x: x[0])[0]])
-                actions_by_security_values.append(security_value)
-
+        actions_by_security_values = self._player_payoffs.security_values
         self.action = actions_by_security_values.index(max(actions_by_security_values))
 
     def get_action(self, round_: int) -> Action:
@@ -261,6 +287,10 @@ class Bully(Strategy):
     def update(self, round_: int, action: Action, payoff: Payoff, opp_action: Action, opp_payoff: Payoff) -> None:
         self.round_ = round_
 
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Bully always plays the same action."""
+        return action == self.action
+
 
 class FictitiousPlay(Strategy):
     """Implements the Fictitious Play algorithm."""
@@ -276,32 +306,33 @@ class FictitiousPlay(Strategy):
         self.round_ = 0
         self.player = player
         self.beliefs = [0 for _ in self.actions]
-        if player == "row":
-            self.payoff_matrix = matrix_suite.payoff_matrix
-        if player == "col":
-            self.payoff_matrix = Utils.transpose(matrix_suite.payoff_matrix)
+        self._player_payoffs = matrix_suite.player_payoffs(player)
+        self.payoff_matrix = self._player_payoffs.matrix
 
     def get_action(self, round_: int) -> Action:
         """Pick the next action."""
         # There might exist multiple possible actions with the same maximum belief value
         actions = [i for i, value in enumerate(self.beliefs) if value == max(self.beliefs)]
         # Pick the next action randomly from the multiple optimal actions
-        action = random.choice(actions)
+        action = self.random_choice(actions)
 
         return action
 
     def update(self, round_: int, action: Action, payoff: Payoff, opp_action: Action, opp_payoff: Payoff) -> None:
-        if self.player == "row":
-            action_potential_payoffs = [row[opp_action][0] for row in self.payoff_matrix]
-        if self.player == "col":
-            action_potential_payoffs = [row[opp_action][1] for row in self.payoff_matrix]
-
         # Get the potential optimal actions
-        action_potential_optimal = [i for i, value in enumerate(action_potential_payoffs) if value == max(action_potential_payoffs)]
+        action_potential_optimal = self._player_payoffs.best_responses[opp_action]
 
         # Update the beliefs
         self.beliefs = [value + 1 if i in action_potential_optimal else value for i, value in enumerate(self.beliefs)]
 
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Locked if *action* has the unique maximum belief and is a best response to *opp_action*,
+        because then its belief grows by 1 every round and no other belief can catch up."""
+        max_belief = max(self.beliefs)
+        if self.beliefs.count(max_belief) != 1 or self.beliefs[action] != max_belief:
+            return False
+        return action in self._player_payoffs.best_responses[opp_action]
+
 
 class RegretMatching(Strategy):
     """Implements the Proportional Regret Matching algorithm."""
@@ -316,10 +347,8 @@ class RegretMatching(Strategy):
 
         self.round_ = 0
         self.player = player
-        if player == "row":
-            self.payoff_matrix = matrix_suite.payoff_matrix
-        if player == "col":
-            self.payoff_matrix = Utils.transpose(matrix_suite.payoff_matrix)
+        self._player_payoffs = matrix_suite.player_payoffs(player)
+        self.payoff_matrix = self._player_payoffs.matrix
         self.cumulative_actual_payoff = 0.0
         self.cumulative_expected_payoffs = [0.0 for _ in self.actions]
         self.regret_matching = [0.0 for _ in self.actions]
@@ -330,9 +359,9 @@ class RegretMatching(Strategy):
             # There might exist multiple possible actions with the same maximum regret value
             actions = [i for i, value in enumerate(self.regret_matching) if value == max(self.regret_matching)]
             # Pick the next action randomly from the multiple optimal actions
-            action = random.choice(actions)
+            action = self.random_choice(actions)
         else:
-            action = random.choice(self.actions)
+            action = self.random_choice(self.actions)
 
         return action
 
@@ -341,10 +370,7 @@ class RegretMatching(Strategy):
         # Update the cumulative actual payoff
         self.cumulative_actual_payoff += payoff
         # Update the cumulative expected payoff
-        if self.player == "row":
-            potential_payoffs = [self.payoff_matrix[x][opp_action][0] for x in self.actions]
-        if self.player == "col":
-            potential_payoffs = [self.payoff_matrix[x][opp_action][1] for x in self.actions]
+        potential_payoffs = self._player_payoffs.potential_payoffs[opp_action]
 
         self.cumulative_expected_payoffs = list(map(lambda x, y: x + y, self.cumulative_expected_payoffs, potential_payoffs))
 
@@ -374,17 +400,12 @@ class Softmax(Strategy):
         self.actions = matrix_suite.get_actions(player)
 
         self.round_ = 0
-        if player == "row":
-            self.payoff_matrix = matrix_suite.payoff_matrix
-            # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
-            payoffs = [tuple[0] for row in self.payoff_matrix for tuple in row]
-        if player == "col":
-            self.payoff_matrix = Utils.transpose(matrix_suite.payoff_matrix)
-            # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
-            payoffs = [tuple[1] for row in self.payoff_matrix for tuple in row]
-
-        min_payoff = min(payoffs)
-        max_payoff = max(payoffs)
+        self.player = player
+        self._player_payoffs = matrix_suite.player_payoffs(player)
+        self.payoff_matrix = self._player_payoffs.matrix
+        # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
+        min_payoff = self._player_payoffs.min_payoff
+        max_payoff = self._player_payoffs.max_payoff
         initial_value = (min_payoff + max_payoff) / 2
         self.geometric_averages = [initial_value for _ in self.actions]
         self.q_values = [self.initial_q_value for _ in self.actions]
@@ -394,7 +415,7 @@ class Softmax(Strategy):
         # Pick the actions with the maximum payoff average
         actions = [i for i, value in enumerate(self.geometric_averages) if value == max(self.geometric_averages)]
         # If there are multiple optimal actions, randomly pick one
-        action = random.choice(actions)
+        action = self.random_choice(actions)
 
         return action
 
@@ -408,6 +429,16 @@ class Softmax(Strategy):
         sum_of_geometric_averages_ = sum(geometric_averages_)
         self.geometric_averages = [x / sum_of_geometric_averages_ for x in geometric_averages_]
 
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Locked if *action* has the unique maximum Q-value and the payoff it keeps getting stays above the others,
+        because its Q-value only moves towards that payoff and the other Q-values don't change."""
+        max_average = max(self.geometric_averages)
+        if self.geometric_averages.count(max_average) != 1 or self.geometric_averages[action] != max_average:
+            return False
+        payoff = self._player_payoffs.payoffs[action][opp_action]
+        other_q_values = [x for i, x in enumerate(self.q_values) if i != action]
+        return not other_q_values or min(self.q_values[action], payoff) > max(other_q_values) + LOCK_MARGIN
+
 
 class MutualBenefit(Strategy):
     """Implements the Mutual Benefit algorithm."""
@@ -421,17 +452,11 @@ class MutualBenefit(Strategy):
         self.actions = matrix_suite.get_actions(player)
 
         self.round_ = 0
-        if player == "row":
-            self.payoff_matrix = matrix_suite.payoff_matrix
-            # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
-            payoffs = [tuple[0] for row in self.payoff_matrix for tuple in row]
-        if player == "col":
-            self.payoff_matrix = Utils.transpose(matrix_suite.payoff_matrix)
-            # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
-            payoffs = [tuple[1] for row in self.payoff_matrix for tuple in row]
-
-        min_payoff = min(payoffs)
-        max_payoff = max(payoffs)
+        self._player_payoffs = matrix_suite.player_payoffs(player)
+        self.payoff_matrix = self._player_payoffs.matrix
+        # Initialize the geometric averages by (max+min)/2 of all the payoffs a player can get
+        min_payoff = self._player_payoffs.min_payoff
+        max_payoff = self._player_payoffs.max_payoff
         self.initial_value = (min_payoff + max_payoff) / 2
 
         self.action_payoff_list = [self.initial_value for _ in self.actions] # the initial total payoff for the row player and col player
@@ -443,7 +468,7 @@ class MutualBenefit(Strategy):
         optimal_actions = [i for i, value in enumerate(action_avg_payoff_list) if value == max(action_avg_payoff_list)]
 
         # If there are multiple optimal actions, randomly pick up one action
-        action = random.choice(optimal_actions)
+        action = self.random_choice(optimal_actions)
 
         return action
 
@@ -451,3 +476,15 @@ class MutualBenefit(Strategy):
         self.round_ = round_
         self.action_payoff_list[action] += payoff + opp_payoff
         self.action_num_list[action] += 1
+
+    def is_locked(self, action: Action, opp_action: Action) -> bool:
+        """Locked if *action* has the unique maximum average and the joint payoff it keeps getting stays above the others,
+        because its average only moves towards that joint payoff and the other averages don't change."""
+        action_avg_payoff_list = list(map(lambda x, y: (x / y), self.action_payoff_list, self.action_num_list))
+        max_avg_payoff = max(action_avg_payoff_list)
+        if action_avg_payoff_list.count(max_avg_payoff) != 1 or action_avg_payoff_list[action] != max_avg_payoff:
+            return False
+        # The payoff matrix of the col player is transposed, but the tuples keep the (row, col) payoff order
+        joint_payoff = sum(self.payoff_matrix[action][opp_action])
+        other_avg_payoffs = [x for i, x in enumerate(action_avg_payoff_list) if i != action]
+        return not other_avg_payoffs or min(max_avg_payoff, joint_payoff) > max(other_avg_payoffs) + LOCK_MARGIN
@@ -7,7 +7,11 @@
 #
 # A function that selects all indices where the maximum value occurs.
 #   (Like argmax but able to return more than one index)
-from typing import Iterable, Any, List
+import hashlib
+import math
+from typing import Iterable, Any, List, Optional, Sequence
+
+import numpy as np
 
 
 def flatten(l: Iterable[Iterable[Any]]) -> List[Any]:
@@ -19,3 +23,142 @@ def transpose(m: Iterable[Iterable[Any]]) -> List[List[Any]]:
     """Transpose the first 2 dimensions of an iterable object with at least 2 dimensions.
     NOTE: only works when sublists are of arbitrary length."""
     return [list(i) for i in zip(*m)]
+
+
+def describe(obj: Any) -> tuple:
+    """Describe an object by its class and public attributes, in a form that has a stable repr.
+    Private attributes (starting with an underscore) are caches and other derived state, so they are left out.
+    NumPy arrays are turned into lists, as their repr rounds the numbers."""
+    return type(obj).__module__, type(obj).__name__, sorted((name, value.tolist() if isinstance(value, np.ndarray) else value)
+                                                            for name, value in vars(obj).items()
+                                                            if not name.startswith("_"))
+
+
+def fingerprint(obj: Any) -> int:
+    """64 bit hash of *describe*, which stays the same between runs and processes (unlike hash)."""
+    return int.from_bytes(hashlib.sha256(repr(describe(obj)).encode()).digest()[:8], "little")
+
+
+class RunningStatistics:
+    """Keep the count, sum, mean and variance of a stream of numbers in constant memory.
+    The mean and variance are updated with Welford's algorithm, which stays accurate for long streams.
+
+    Class attributes:
+        *count*: Number of values added so far.
+
+        *total*: Sum of the values added so far.
+
+        *mean*: Running mean of the values.
+
+        *m2*: Running sum of the squared differences from the mean.
+    """
+    __slots__ = ("count", "total", "mean", "m2")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float) -> None:
+        """Add one value to the stream."""
+        self.count += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def add_repeated(self, x: float, n: int) -> None:
+        """Add the same value *n* times in O(1), by merging it as a block with zero variance."""
+        if n <= 0:
+            return
+        count = self.count + n
+        delta = x - self.mean
+        self.total += x * n
+        self.mean += delta * n / count
+        self.m2 += delta * delta * self.count * n / count
+        self.count = count
+
+    def variance(self) -> float:
+        """Sample variance of the values, 0 if there are less than 2."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def standard_error(self) -> float:
+        """Standard error of the mean, infinite if there are less than 2 values."""
+        return math.sqrt(self.variance() / self.count) if self.count > 1 else math.inf
+
+
+class RandomStream:
+    """A seeded stream of uniform random numbers in [0, 1) for a single strategy instance.
+    The numbers are drawn from a NumPy generator in blocks of *block_size* and handed out one at a time,
+    which is faster than a call to the random module per number and doesn't share state between games.
+
+    Class attributes:
+        *generator*: The NumPy generator the blocks are drawn from.
+
+        *block_size*: Number of uniforms drawn per block.
+    """
+    generator: np.random.Generator
+    block_size: int
+
+    def __init__(self, seed: Any, block_size: int = 1024) -> None:
+        """:param seed: Anything np.random.default_rng accepts, i.e. an int or a SeedSequence."""
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._block = []
+        self._index = 0
+
+    def uniform(self) -> float:
+        """Return the next uniform random number in [0, 1)."""
+        if self._index == len(self._block):
+            self._block = self.generator.random(self.block_size).tolist()
+            self._index = 0
+        u = self._block[self._index]
+        self._index += 1
+        return u
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        """Pick a random item from a non-empty sequence, using exactly one uniform."""
+        n = len(seq)
+        return seq[min(int(self.uniform() * n), n - 1)]
+
+
+class BatchedRandomStream:
+    """A batch of independent RandomStreams, one per strategy copy, handing out uniforms for many copies at once.
+    Copy b gives exactly the same numbers as RandomStream(seeds[b], block_size),
+    and only the copies that are asked for a number advance, so a batch can follow the draws of the scalar streams.
+
+    Class attributes:
+        *generators*: The NumPy generator of every copy.
+
+        *block_size*: Number of uniforms drawn per block.
+    """
+    generators: List[np.random.Generator]
+    block_size: int
+
+    def __init__(self, seeds: Sequence[Any], block_size: int = 1024) -> None:
+        """:param seeds: One seed per copy, anything np.random.default_rng accepts."""
+        self.generators = [np.random.default_rng(seed) for seed in seeds]
+        self.block_size = block_size
+        self._blocks = np.zeros((len(seeds), block_size))
+        self._indices = np.full(len(seeds), block_size)
+
+    def __len__(self) -> int:
+        return len(self.generators)
+
+    def uniforms(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the next uniform of every copy where *mask* is True (all copies by default), 0.0 for the others."""
+        copies = np.arange(len(self.generators)) if mask is None else np.flatnonzero(mask)
+        for b in copies[self._indices[copies] == self.block_size]:
+            self._blocks[b] = self.generators[b].random(self.block_size)
+            self._indices[b] = 0
+        out = np.zeros(len(self.generators))
+        out[copies] = self._blocks[copies, self._indices[copies]]
+        self._indices[copies] += 1
+        return out
+
+    def choices(self, counts: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pick a random index below *counts[b]* for every copy where *mask* is True, using exactly one uniform each,
+        the same way RandomStream.choice picks an item from a sequence of that length. The others get 0."""
+        indices = (self.uniforms(mask) * counts).astype(int)
+        return np.minimum(indices, np.maximum(counts - 1, 0))
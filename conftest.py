@@ -0,0 +1,5 @@
+# The modules live in the root of the repository, so make them importable from the tests.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
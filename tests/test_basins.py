@@ -0,0 +1,39 @@
+import itertools
+import math
+
+import numpy as np
+
+import MatrixSuite
+import Strategies
+from Basins import grid_points, map_basins
+from GrandTable import GrandTable
+
+
+def random_grand_table(seed: int, nr_of_strategies: int = 9) -> GrandTable:
+    """A grand table with random scores, without playing it."""
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=seed),
+                             [Strategies.EpsilonGreedy(i / 10) for i in range(nr_of_strategies)], 0, 1)
+    grand_table.grand_table = np.random.default_rng(seed).uniform(0, 3, (nr_of_strategies, nr_of_strategies)).tolist()
+    return grand_table
+
+
+def test_points_are_only_counted_at_stable_rest_points():
+    """Points that stop near a saddle, where the dynamic is slow, are stepped on until they reach a stable one."""
+    basin_map = map_basins(random_grand_table(4), nr_of_points=400, workers=1)
+    assert basin_map.counts.sum() > 0.95 * basin_map.nr_of_points
+    for point, count in zip(basin_map.rest_points, basin_map.counts):
+        assert count == 0 or point.stability == "stable"
+
+
+def test_grid_chunks_are_the_grid_in_order():
+    """The chunks start anywhere in the grid and together give every point once, in lexicographic order."""
+    for nr_of_strategies, resolution in [(2, 5), (3, 4), (5, 3)]:
+        total = math.comb(resolution + nr_of_strategies - 1, nr_of_strategies - 1)
+        chunks = [grid_points(nr_of_strategies, resolution, start, min(start + 4, total))
+                  for start in range(0, total, 4)]
+        points = np.vstack(chunks)
+        bars = list(itertools.combinations(range(resolution + nr_of_strategies - 1), nr_of_strategies - 1))
+        assert len(points) == len(bars)
+        for point, bar in zip(points, bars):
+            edges = [-1] + list(bar) + [resolution + nr_of_strategies - 1]
+            assert point.tolist() == [(right - left - 1) / resolution for left, right in zip(edges, edges[1:])]
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from Distributed import Coordinator, run_worker
+
+
+def square(x):
+    return x * x
+
+
+def fail(x):
+    raise ValueError("unit " + str(x) + " always fails")
+
+
+def run_with_workers(coordinator, function, args_list, nr_of_workers):
+    workers = [threading.Thread(target=run_worker, args=(coordinator.address, coordinator.authkey), daemon=True)
+               for _ in range(nr_of_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        return coordinator.run(function, args_list)
+    finally:
+        for worker in workers:
+            worker.join(timeout=10)
+
+
+def test_results_come_back_in_order():
+    coordinator = Coordinator()
+    assert run_with_workers(coordinator, square, [(x,) for x in range(10)], 2) == [x * x for x in range(10)]
+
+
+def test_failing_unit_stops_the_run_after_max_attempts():
+    """One worker, fewer than max_attempts, must not retry a failing unit forever."""
+    coordinator = Coordinator(max_attempts=3)
+    with pytest.raises(Exception, match="failed 3 times"):
+        run_with_workers(coordinator, fail, [(1,)], 1)
+    assert coordinator.attempts[0] == 3
+
+
+def test_no_default_key():
+    assert len(Coordinator().authkey) == 32
+    assert Coordinator().authkey != Coordinator().authkey
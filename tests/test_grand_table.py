@@ -0,0 +1,86 @@
+import pytest
+
+import MatrixSuite
+import Strategies
+from GrandTable import GrandTable
+
+
+def test_add_strategy_after_play_parallel():
+    """Adding a strategy to a table played in parallel gives the table played with it from the start."""
+    strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1)]
+    added = Strategies.Bully()
+
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), strategies, 2, 20)
+    grand_table.play_parallel(seed=7, workers=1)
+    grand_table.add_strategy(added, workers=1)
+
+    full = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), strategies[:2] + [Strategies.Bully()], 2, 20)
+    full.play_parallel(seed=7, workers=1)
+    assert grand_table.grand_table == full.grand_table
+
+
+def test_add_strategy_with_worker_processes():
+    strategies = [Strategies.Aselect(), Strategies.Bully()]
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), strategies, 1, 20)
+    grand_table.play_parallel(seed=3, workers=2)
+    grand_table.add_strategy(Strategies.FictitiousPlay(), workers=2)
+    assert len(grand_table.grand_table) == 3
+    assert all(len(row) == 3 for row in grand_table.grand_table)
+
+
+@pytest.mark.parametrize("restarts_per_batch", [None, 1, 2])
+def test_play_batched_matches_play_parallel(restarts_per_batch):
+    strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0),
+                  Strategies.Softmax(5.0, 0.1, 1.0), Strategies.RegretMatching()]
+    parallel = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=5), strategies, 4, 30)
+    parallel.play_parallel(seed=8, workers=1)
+    batched = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=5), strategies, 4, 30)
+    batched.play_batched(seed=8, restarts_per_batch=restarts_per_batch)
+    assert batched.grand_table == parallel.grand_table
+
+
+def test_remove_strategy_after_play_parallel():
+    """Removing a strategy from a table played in parallel gives the table played without it."""
+    strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0)]
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), strategies, 2, 20)
+    grand_table.play_parallel(seed=7, workers=1)
+    grand_table.remove_strategy(1)
+
+    without = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [strategies[0], strategies[2]], 2, 20)
+    without.play_parallel(seed=7, workers=1)
+    assert grand_table.grand_table == without.grand_table
+
+
+def test_remove_strategy_needs_a_seeded_table():
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.Aselect(), Strategies.Bully()], 1, 5)
+    grand_table.play()
+    with pytest.raises(Exception, match="play_parallel"):
+        grand_table.remove_strategy(0)
+
+
+def test_checkpoint_only_resumes_the_same_configuration(tmp_path):
+    path = str(tmp_path / "checkpoint.pickle")
+    saved = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.EpsilonGreedy(0.1)], 3, 10)
+    saved.matrix_suite.generate_new_payoff_matrix()
+    saved.save_checkpoint(path, 2)
+
+    same = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.EpsilonGreedy(0.1)], 3, 10)
+    assert same.load_checkpoint(path) == 2
+    for other in (GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.EpsilonGreedy(0.2)], 3, 10),
+                  GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=2), [Strategies.EpsilonGreedy(0.1)], 3, 10)):
+        with pytest.raises(Exception, match="different grand table configuration"):
+            other.load_checkpoint(path)
+
+
+@pytest.mark.parametrize("common_random_numbers", [False, True])
+def test_play_vectorized_matches_play_parallel(common_random_numbers):
+    strategies = [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0),
+                  Strategies.SatisficingPlay(0.1, 2.0), Strategies.Bully(), Strategies.FictitiousPlay(),
+                  Strategies.RegretMatching(), Strategies.Softmax(5.0, 0.1, 1.0), Strategies.MutualBenefit()]
+    parallel = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=4), strategies, 2, 50,
+                          common_random_numbers=common_random_numbers)
+    parallel.play_parallel(seed=9, workers=1)
+    vectorized = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=4), strategies, 2, 50,
+                            common_random_numbers=common_random_numbers)
+    vectorized.play_vectorized(seed=9)
+    assert vectorized.grand_table == parallel.grand_table
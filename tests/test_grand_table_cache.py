@@ -0,0 +1,39 @@
+import importlib
+
+import MatrixSuite
+import Strategies
+from GrandTableCache import GrandTableCache, cache_key
+
+
+def test_hit_leaves_the_matrix_suite_where_playing_does(tmp_path):
+    cache = GrandTableCache(str(tmp_path))
+    strategies = [Strategies.Aselect(), Strategies.Bully()]
+    played_suite = MatrixSuite.RandomIntMatrixSuite(seed=3)
+    played = cache.play(played_suite, strategies, 3, 10, seed=1)
+    loaded_suite = MatrixSuite.RandomIntMatrixSuite(seed=3)
+    loaded = cache.play(loaded_suite, strategies, 3, 10, seed=1)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert loaded.grand_table == played.grand_table
+    assert loaded_suite.k == played_suite.k
+    assert loaded_suite.payoff_matrix == played_suite.payoff_matrix
+
+
+def test_key_changes_with_the_source_of_a_strategy(tmp_path, monkeypatch):
+    source = """import Strategies
+
+
+class Stubborn(Strategies.Bully):
+    pass
+"""
+    (tmp_path / "stubborn.py").write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    stubborn = importlib.import_module("stubborn")
+
+    def key():
+        return cache_key(MatrixSuite.RandomIntMatrixSuite(seed=3), [stubborn.Stubborn()], 3, 10, seed=1)
+
+    before = key()
+    assert key() == before
+    (tmp_path / "stubborn.py").write_text(source + "\n# Changed\n")
+    assert key() != before
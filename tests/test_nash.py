@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import Nash
+
+
+def cyclic_game(n: int) -> np.ndarray:
+    """Rock-paper-scissors with n strategies: every strategy beats the next (n - 1) / 2 and loses to the others."""
+    a = np.zeros((n, n))
+    for i in range(n):
+        for k in range(1, n):
+            a[i, (i + k) % n] = 1.0 if k % 2 else -1.0
+    return a
+
+
+@pytest.mark.parametrize("n", [7, 9])
+@pytest.mark.parametrize("scale", [1e-6, 0.01, 1.0, 100.0])
+def test_support_enumeration_does_not_depend_on_the_payoff_scale(n, scale):
+    a, b = Nash.bimatrix((cyclic_game(n) * scale).tolist())
+    equilibria = Nash.support_enumeration(a, b)
+    assert len(equilibria) == 1
+    np.testing.assert_allclose(equilibria[0].row_strategy, np.full(n, 1 / n))
+    np.testing.assert_allclose(equilibria[0].col_strategy, np.full(n, 1 / n))
+
+    lemke_howson = Nash.lemke_howson(a, b)
+    np.testing.assert_allclose(lemke_howson.row_strategy, equilibria[0].row_strategy)
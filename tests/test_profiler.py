@@ -0,0 +1,40 @@
+import pytest
+
+import MatrixSuite
+import Strategies
+from GrandTable import GrandTable
+from Profiler import Profiler
+
+
+def profiled_table() -> GrandTable:
+    return GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.Aselect(), Strategies.UCB(1.0)], 2, 25,
+                      profiler=Profiler())
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_play_parallel_merges_the_profiles_of_the_cells(workers):
+    grand_table = profiled_table()
+    grand_table.play_parallel(seed=3, workers=workers)
+    records = grand_table.profiler.records
+    # 3 restarts of 2 x 2 cells of 25 rounds
+    assert records["Game", "payoff_lookup"][0] == 3 * 4 * 25
+    assert records["UCB", "update"][0] == 3 * 4 * 25
+
+
+def test_profiling_doesnt_change_the_grand_table():
+    profiled = profiled_table()
+    profiled.play_parallel(seed=3, workers=1)
+    plain = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=1), [Strategies.Aselect(), Strategies.UCB(1.0)], 2, 25)
+    plain.play_parallel(seed=3, workers=1)
+    assert profiled.grand_table == plain.grand_table
+
+
+def test_folded_stacks_name_the_calling_method(tmp_path):
+    grand_table = profiled_table()
+    grand_table.play()
+    path = tmp_path / "profile.folded"
+    grand_table.profiler.to_folded(str(path))
+    stacks = [line.rsplit(" ", 1)[0] for line in path.read_text().splitlines()]
+    assert "Game.initialize;UCB;initialize" in stacks
+    assert "Game.play;UCB;get_action" in stacks
+    assert not any(stack.startswith("Game.play;") and stack.endswith(";initialize") for stack in stacks)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+import MatrixSuite
+import Strategies
+from GrandTable import GrandTable
+from ReplicatorDynamic import BatchedReplicatorDynamic, ReplicatorDynamic, TrajectoryWriter, read_trajectory
+
+
+def random_grand_table(seed: int, nr_of_strategies: int = 5) -> GrandTable:
+    """A grand table with random positive scores, without playing it."""
+    grand_table = GrandTable(MatrixSuite.RandomIntMatrixSuite(seed=seed),
+                             [Strategies.EpsilonGreedy(i / 10) for i in range(nr_of_strategies)], 0, 1)
+    grand_table.grand_table = np.random.default_rng(seed).uniform(1, 3, (nr_of_strategies, nr_of_strategies)).tolist()
+    return grand_table
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_batched_replicator_dynamic_matches_single_runs(seed):
+    grand_table = random_grand_table(seed)
+    start_proportions = np.random.default_rng(seed).dirichlet(np.ones(5), 50)
+    batched = BatchedReplicatorDynamic(start_proportions, grand_table)
+    batched.evolve()
+    for p, proportions in enumerate(start_proportions.tolist()):
+        single = ReplicatorDynamic(proportions, grand_table, keep_history=False)
+        single.evolve()
+        assert batched.steps[p] == single.steps
+        assert batched.proportions[p].tolist() == single.new_proportions
+
+
+def test_trajectory_writer_keeps_the_old_file_on_an_exception(tmp_path):
+    path = str(tmp_path / "trajectory.bin")
+    with TrajectoryWriter(path, 2) as writer:
+        writer.write(0, [0.5, 0.5])
+
+    with pytest.raises(ValueError):
+        with TrajectoryWriter(path, 2) as writer:
+            writer.write(0, [0.25, 0.75])
+            raise ValueError("evolution failed")
+
+    times, proportions = read_trajectory(path)
+    assert proportions.tolist() == [[0.5, 0.5]]
+    assert not os.path.exists(path + ".tmp")
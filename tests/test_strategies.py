@@ -0,0 +1,24 @@
+import MatrixSuite
+import Strategies
+from Utils import RandomStream, fingerprint
+
+
+def nine_strategies():
+    return [Strategies.Aselect(), Strategies.EpsilonGreedy(0.1), Strategies.UCB(1.0),
+            Strategies.SatisficingPlay(0.1, 2.0), Strategies.Bully(), Strategies.FictitiousPlay(),
+            Strategies.RegretMatching(), Strategies.Softmax(5.0, 0.1, 1.0), Strategies.MutualBenefit()]
+
+
+def test_fingerprint_of_initialized_strategies_is_stable():
+    """The fingerprint only depends on the parameters and the state, not on where the objects are in memory."""
+    for first, second in zip(nine_strategies(), nine_strategies()):
+        first.initialize(MatrixSuite.RandomIntMatrixSuite(seed=2), "row")
+        second.initialize(MatrixSuite.RandomIntMatrixSuite(seed=2), "row")
+        assert fingerprint(first) == fingerprint(second), first.name
+
+
+def test_fingerprint_does_not_depend_on_the_random_stream():
+    for first, second in zip(nine_strategies(), nine_strategies()):
+        first.set_random_stream(RandomStream(1))
+        second.set_random_stream(RandomStream(2))
+        assert fingerprint(first) == fingerprint(second), first.name